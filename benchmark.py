@@ -0,0 +1,435 @@
+"""
+Benchmarks for the `gqylpy_log` call path, run it directly:
+
+    $ python benchmark.py [--number N] [--output results.json]
+
+Each case is compared against the same work done with `logging.Logger`
+directly, as baseline. For both, the throughput (calls per second), the p50
+and p99 latency of a single call, and the bytes allocated by a single call
+(`tracemalloc`, the peak during the call) are reported. With `--output`, the
+results are also written as JSON.
+"""
+import os
+import sys
+import json
+import time
+import timeit
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import tracemalloc
+
+from typing import Any, Callable, Dict, List
+
+import gqylpy_log as glog
+
+NUMBER = 100000
+
+# Latency and allocations are measured call by call, on fewer calls.
+SAMPLES = 10000
+
+results: List[Dict[str, Any]] = []
+
+
+def measure(call: Callable[[], Any], number: int) -> Dict[str, float]:
+    ops: float = number / min(timeit.repeat(call, number=number, repeat=3))
+
+    timer: Callable[[], int] = time.perf_counter_ns
+    latencies: List[int] = []
+    for _ in range(min(number, SAMPLES)):
+        start: int = timer()
+        call()
+        latencies.append(timer() - start)
+    latencies.sort()
+
+    allocated: List[int] = []
+    tracemalloc.start()
+    try:
+        for _ in range(min(number, SAMPLES) // 10):
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            call()
+            allocated.append(tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+    allocated.sort()
+
+    return {
+        "ops":       ops,
+        "p50_ns":    latencies[len(latencies) // 2],
+        "p99_ns":    latencies[len(latencies) * 99 // 100],
+        "allocated": allocated[len(allocated) // 2]
+    }
+
+
+def record(
+        title:       str,
+        glog_result: Dict[str, float],
+        raw_result:  Dict[str, float]
+) -> None:
+    results.append({"case": title, "glog": glog_result, "logging": raw_result})
+
+    def row(name: str, result: Dict[str, float]) -> str:
+        return (
+            f"{name} {result['ops']:>11,.0f} ops/s "
+            f"p50 {result['p50_ns'] / 1000:>8.2f} us "
+            f"p99 {result['p99_ns'] / 1000:>8.2f} us "
+            f"{result['allocated']:>7,} B"
+        )
+
+    print(f"{title:<44} {row('glog   ', glog_result)}")
+    print(f"{'':<44} {row('logging', raw_result)}")
+
+
+def report(
+        title:     str,
+        glog_call: str,
+        raw_call:  str,
+        *,
+        number:    int = 0,
+        **namespace
+) -> None:
+    namespace.update(glog=glog, logging=logging)
+    number = number or NUMBER
+
+    record(
+        title,
+        measure(eval(f"lambda: {glog_call}", namespace), number),
+        measure(eval(f"lambda: {raw_call}", namespace), number)
+    )
+
+
+def raw_logger(
+        name:      str,
+        handler:   logging.Handler,
+        formatter: logging.Formatter
+) -> logging.Logger:
+    # Not registered in `logging.Logger.manager`, like the loggers of
+    # `gqylpy_log`.
+    logger = logging.Logger(name, logging.DEBUG)
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+    return logger
+
+
+def bench_dispatch() -> None:
+    disabled: logging.Logger = glog.__init__(
+        "bench-disabled",
+        level=glog.CRITICAL,
+        handlers=[logging.NullHandler()],
+        gname="bench_disabled"
+    )
+    enabled: logging.Logger = glog.__init__(
+        "bench-enabled",
+        level=glog.DEBUG,
+        formatter={"fmt": "%(message)s"},
+        handlers=[logging.NullHandler()],
+        gname="bench_enabled"
+    )
+
+    report(
+        "info, disabled level",
+        'glog.info("message", gname="bench_disabled")',
+        'logging.Logger.info(logger, "message")',
+        logger=disabled
+    )
+    report(
+        "debug, disabled level, large object",
+        'glog.debug("response", large, gname="bench_disabled")',
+        'logging.Logger.debug(logger, "response %s", large)',
+        logger=disabled, large={i: "x" * 32 for i in range(1000)}
+    )
+    report(
+        "info, enabled level, NullHandler",
+        'glog.info("message", gname="bench_enabled")',
+        'logging.Logger.info(logger, "message")',
+        logger=enabled
+    )
+    report(
+        "info, 3 arguments, NullHandler",
+        'glog.info("user", 42, "logged in", gname="bench_enabled")',
+        'logging.Logger.info(logger, "%s %s %s", "user", 42, "logged in")',
+        logger=enabled
+    )
+    report(
+        "info, oneline, NullHandler",
+        'glog.info("a\\nb\\nc", oneline=True, gname="bench_enabled")',
+        'logging.Logger.info(logger, "a\\nb\\nc".replace("\\n", " "))',
+        logger=enabled
+    )
+
+
+def bench_find_caller() -> None:
+    for mode in "fast", "off":
+        logger: logging.Logger = glog.__init__(
+            f"bench-find-caller-{mode}",
+            level=glog.DEBUG,
+            formatter={"fmt": "%(message)s"},
+            options={"findCaller": mode},
+            handlers=[logging.NullHandler()],
+            gname=f"bench_find_caller_{mode}"
+        )
+        report(
+            f"info, findCaller {mode!r}, NullHandler",
+            f'glog.info("message", gname="bench_find_caller_{mode}")',
+            'logging.Logger.info(logger, "message")',
+            logger=logger
+        )
+
+
+def bench_gnames() -> None:
+    for count in 1, 10, 1000:
+        for i in range(count):
+            logger: logging.Logger = glog.__init__(
+                f"bench-gnames-{count}-{i}",
+                level=glog.CRITICAL,
+                handlers=[logging.NullHandler()],
+                gname=f"bench_gnames_{count}_{i}"
+            )
+        report(
+            f"info, disabled level, {count} gnames",
+            f'glog.info("message", gname="bench_gnames_{count}_{count - 1}")',
+            'logging.Logger.info(logger, "message")',
+            logger=logger
+        )
+
+
+def bench_formatter() -> None:
+    params = {
+        "fmt": "[%(asctime)s] [%(module)s.%(funcName)s.line%(lineno)d] "
+               "[%(levelname)s] %(message)s",
+        "datefmt": "%F %T"
+    }
+    gcode = __import__("gqylpy_log.g log", fromlist=...)
+
+    report(
+        "format, default format",
+        "compiled.format(record)",
+        "formatter.format(record)",
+        record=logging.LogRecord(
+            "bench", logging.INFO, __file__, 1, "message", None, None, "bench"
+        ),
+        compiled=gcode.create_formatter({**params, "compiled": True}),
+        formatter=logging.Formatter(**params)
+    )
+
+
+def bench_handlers(directory: str) -> None:
+    params = {
+        "fmt": "[%(asctime)s] [%(module)s.%(funcName)s.line%(lineno)d] "
+               "[%(levelname)s] %(message)s",
+        "datefmt": "%F %T",
+        "compiled": True
+    }
+    raw_formatter = logging.Formatter(params["fmt"], params["datefmt"])
+    devnull = open(os.devnull, "w")
+
+    glog.__init__(
+        "bench-default-formatter",
+        level=glog.DEBUG,
+        formatter=params,
+        handlers=[logging.StreamHandler(devnull)],
+        gname="bench_default_formatter"
+    )
+    report(
+        "info, default formatter, StreamHandler",
+        'glog.info("message", gname="bench_default_formatter")',
+        'logging.Logger.info(logger, "message")',
+        logger=raw_logger(
+            "raw", logging.StreamHandler(devnull), raw_formatter
+        )
+    )
+    report(
+        "info, large message (64 KiB), StreamHandler",
+        'glog.info(large, gname="bench_default_formatter")',
+        'logging.Logger.info(logger, large)',
+        number=NUMBER // 10,
+        large="x" * (1 << 16),
+        logger=raw_logger(
+            "raw", logging.StreamHandler(devnull), raw_formatter
+        )
+    )
+
+    for name in "FileHandler", "BufferedFileHandler", "BinaryFileHandler":
+        glog_file: str = os.path.join(directory, f"glog-{name}.log")
+        raw_file:  str = os.path.join(directory, f"logging-{name}.log")
+        logger: logging.Logger = glog.__init__(
+            f"bench-{name}",
+            level=glog.DEBUG,
+            formatter=params,
+            handlers=[{"name": name, "filename": glog_file}],
+            gname=f"bench_{name}"
+        )
+        raw: logging.Logger = \
+            raw_logger("raw", logging.FileHandler(raw_file), raw_formatter)
+        report(
+            f"info, default formatter, {name}",
+            f'glog.info("message", gname="bench_{name}")',
+            'logging.Logger.info(logger, "message")',
+            logger=raw
+        )
+        for handler in logger.handlers + raw.handlers:
+            handler.close()
+        ratio: float = os.path.getsize(glog_file) / os.path.getsize(raw_file)
+        print(f"{'':<44} file size {ratio:.2f} of logging's")
+
+    # The record is formatted and encoded once for the three handlers.
+    logger: logging.Logger = glog.__init__(
+        "bench-shared-formatter",
+        level=glog.DEBUG,
+        formatter=params,
+        handlers=[
+            {"name": "FileHandler", "filename": os.path.join(
+                directory, f"glog-shared-{i}.log"
+            )} for i in range(3)
+        ],
+        gname="bench_shared_formatter"
+    )
+    raw: logging.Logger = logging.Logger("raw", logging.DEBUG)
+    for i in range(3):
+        handler = logging.FileHandler(
+            os.path.join(directory, f"logging-shared-{i}.log")
+        )
+        handler.setFormatter(raw_formatter)
+        raw.addHandler(handler)
+    report(
+        "info, 3 FileHandlers sharing a formatter",
+        'glog.info("message", gname="bench_shared_formatter")',
+        'logging.Logger.info(logger, "message")',
+        logger=raw
+    )
+    for handler in logger.handlers + raw.handlers:
+        handler.close()
+
+
+def bench_threads(directory: str) -> None:
+    # Contention on the lock of a shared handler, with and without option
+    # `formatOutsideLock`. The lines written are checked to be whole.
+    params = {
+        "fmt": "%(asctime)s %(threadName)s %(module)s.%(funcName)s "
+               "%(levelname)s %(message)s"
+    }
+
+    for count in 1, 2, 4, 8, 16, 32, 64:
+        for options in {}, {"formatOutsideLock": True}:
+            mode: str = "formatOutsideLock" if options else "default"
+            filename: str = os.path.join(directory, f"glog-{mode}-{count}.log")
+            logger: logging.Logger = glog.__init__(
+                f"bench-threads-{mode}-{count}",
+                level=glog.DEBUG,
+                formatter=params,
+                options=options,
+                handlers=[{"name": "FileHandler", "filename": filename}],
+                gname=f"bench_threads_{count}"
+            )
+            raw: logging.Logger = raw_logger("raw", logging.FileHandler(
+                os.path.join(directory, f"logging-{mode}-{count}.log")
+            ), logging.Formatter(params["fmt"]))
+
+            def glog_call(gname: str = f"bench_threads_{count}") -> None:
+                glog.info("message", gname=gname)
+
+            record(
+                f"info, FileHandler, {mode}, {count} threads",
+                measure_threads(glog_call, count),
+                measure_threads(lambda: raw.info("message"), count)
+            )
+            for handler in logger.handlers + raw.handlers:
+                handler.close()
+
+            with open(filename) as f:
+                for line in f:
+                    assert line.endswith(" INFO message\n"), line
+
+
+def measure_threads(call: Callable[[], Any], count: int) -> Dict[str, float]:
+    number: int = max(NUMBER // 5 // count, 100)
+    barrier = threading.Barrier(count + 1)
+    latencies: List[int] = []
+
+    def run() -> None:
+        timer: Callable[[], int] = time.perf_counter_ns
+        thread_latencies: List[int] = []
+        barrier.wait()
+        for _ in range(number):
+            start: int = timer()
+            call()
+            thread_latencies.append(timer() - start)
+        latencies.extend(thread_latencies)
+
+    threads = [threading.Thread(target=run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start: float = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    seconds: float = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "ops":       number * count / seconds,
+        "p50_ns":    latencies[len(latencies) // 2],
+        "p99_ns":    latencies[len(latencies) * 99 // 100],
+        "allocated": measure(call, 1000)["allocated"]
+    }
+
+
+def bench_import() -> None:
+    # Measured in fresh interpreters, `-X importtime` reports microseconds.
+    # The package measured is the one next to this file.
+    code = "import gqylpy_log as glog; glog.debug('message')"
+    root: str = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=root)
+    times = []
+    for _ in range(5):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code], cwd=root,
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            text=True
+        )
+        if process.returncode != 0:
+            raise RuntimeError(
+                f"importing gqylpy_log failed:\n{process.stderr}"
+            )
+        modules = {}
+        for line in process.stderr.splitlines():
+            if not line.startswith("import time:") or "[us]" in line:
+                continue
+            _, cumulative, name = line.split("|")
+            modules[name.strip()] = int(cumulative)
+        times.append(modules["gqylpy_log"])
+        assert "logging.handlers" not in modules, \
+            "importing gqylpy_log imports logging.handlers"
+    print(f"{'import gqylpy_log':<44} {min(times) / 1000:>11.1f} ms")
+    results.append({"case": "import", "glog": {"import_us": min(times)}})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--number", type=int, default=NUMBER)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+    NUMBER = args.number
+
+    with tempfile.TemporaryDirectory() as directory:
+        bench_dispatch()
+        bench_find_caller()
+        bench_gnames()
+        bench_formatter()
+        bench_handlers(directory)
+        bench_threads(directory)
+        bench_import()
+        logging.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "python":   platform.python_version(),
+                "platform": platform.platform(),
+                "number":   NUMBER,
+                "results":  results
+            }, f, indent=2)
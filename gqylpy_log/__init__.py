@@ -53,13 +53,37 @@ class DictFormatter(TypedDict, total=False):
     datefmt:  str
     style:    str
     validate: bool
+    compiled: bool
+    fields:   List[str]
 
     if sys.version_info >= (3, 10):
         defaults: Mapping[str, Any]
 
 
-class Options(TypedDict, total=False):
-    onlyRecordCurrentLevel: bool
+# Functional syntax, "async" is a keyword.
+Options = TypedDict("Options", {
+    "onlyRecordCurrentLevel": bool,
+    "async":                  bool,
+    "asyncQueueSize":         int,
+    "asyncOverflow":          str,
+    "findCaller":             str,
+    "collector":              Union[str, List[Any]],
+    "collectorAuthkey":       str,
+    "collectorLinger":        float,
+    "sample":                 float,
+    "rateLimit":              Dict[str, float],
+    "suppressedSummary":      float,
+    "collapseDuplicates":     Union[bool, float],
+    "tailBuffer":             int,
+    "tailBufferTrigger":      Level,
+    "stats":                  bool,
+    "statsSample":            float,
+    "statsInterval":          float,
+    "oneline":                bool,
+    "linesep":                str,
+    "maxMessageLength":       int,
+    "formatOutsideLock":      bool
+}, total=False)
 
 
 Formatter: TypeAlias = Union[DictFormatter, logging.Formatter]
@@ -108,7 +132,8 @@ default: Annotated[DefaultLoggerConfig, """
     "formatter": {
         "fmt": "[%(asctime)s] [%(module)s.%(funcName)s.line%(lineno)d] "
                "[%(levelname)s] %(message)s",
-        "datefmt": "%F %T"
+        "datefmt": "%F %T",
+        "compiled": True
     },
     "handlers": [{"name": "StreamHandler"}]
 }
@@ -146,6 +171,27 @@ def __init__(
         All key-value pairs in the dictionary will be passed as keyword
         arguments to `logging.Formatter` to instantiate an instance.
 
+        If the dictionary contains `"compiled": True`, a faster formatter that
+        produces exactly the same output is instantiated instead: it caches the
+        rendered time per second, and renders a "%"-style format with a single
+        positional interpolation.
+
+        If the dictionary contains `"style": "json"`, each record is rendered
+        as one JSON object. The other supported keys are: `fields`, the list
+        of record attributes to output, defaulting to `["asctime", "levelname",
+        "name", "module", "funcName", "lineno", "message"]`; `datefmt`;
+        `extra`, whether to append the fields passed by the keyword argument
+        `extra`, defaulting to True; `msg_array`, output the log messages as an
+        array rather than joined, defaulting to False; `ensure_ascii`,
+        defaulting to False. A `fmt` is ignored.
+
+        Handlers whose formatters are created from equal dictionaries share one
+        formatter. A record is then formatted once for the handlers created
+        from dictionaries that have no filters of their own, and encoded once
+        for the file handlers with the same encoding. `FileHandler` and
+        the rotating handlers write the encoded bytes to the file directly,
+        rather than through a text file.
+
     @param filters:
         The default list of log filters. If no log filters are defined in
         `handlers`, these filters will be used. Log filters can be instances
@@ -169,6 +215,110 @@ def __init__(
         |                        | level, silently ignoring logs at non-current|
         |                        | levels                                      |
         ------------------------------------------------------------------------
+        | async                  | Handlers do not write on the calling thread,|
+        |                        | records are put into a queue and written by |
+        |                        | a background thread. Handlers with the same |
+        |                        | queue options share one queue, the queues   |
+        |                        | are drained at exit                         |
+        ------------------------------------------------------------------------
+        | asyncQueueSize         | Maximum size of the queue of option `async`,|
+        |                        | defaulting to 0, meaning unbounded          |
+        ------------------------------------------------------------------------
+        | asyncOverflow          | What to do when the queue is full: "block"  |
+        |                        | (default) waits for free space, "dropNewest"|
+        |                        | discards the new record, "dropOldest"       |
+        |                        | discards the oldest queued record. Dropped  |
+        |                        | records are counted in attribute `dropped`  |
+        |                        | of the queue handler                        |
+        ------------------------------------------------------------------------
+        | findCaller             | Logger-level only. How the caller info      |
+        |                        | (`module`, `funcName`, `lineno`, ...) is    |
+        |                        | found: "fast" walks the stack as `logging`  |
+        |                        | of the running version, with a per code     |
+        |                        | object cache; "off" skips it, leaving the   |
+        |                        | fields unknown; "auto" is "off" when no     |
+        |                        | formatter references those fields,          |
+        |                        | otherwise "fast"                            |
+        ------------------------------------------------------------------------
+        | collector              | Logger-level only. An address (a Unix socket|
+        |                        | path, or [host, port]) of a collector       |
+        |                        | process. The handlers are created only in   |
+        |                        | the collector, every process calling        |
+        |                        | `__init__` with the same address sends its  |
+        |                        | records there. The collector is started by  |
+        |                        | the first process that logs. The handlers,  |
+        |                        | the formatter and the options must be JSON  |
+        |                        | serializable, `filters` are applied in the  |
+        |                        | sending process. While the collector cannot |
+        |                        | be reached, records are dropped (retried    |
+        |                        | every second) and counted in attribute      |
+        |                        | `dropped` of the handler; the count is sent |
+        |                        | as a WARNING record once connected again    |
+        ------------------------------------------------------------------------
+        | collectorAuthkey       | A secret the processes and the collector    |
+        |                        | authenticate each other with                |
+        ------------------------------------------------------------------------
+        | collectorLinger        | Seconds the collector keeps running after   |
+        |                        | the last process disconnected, default 10   |
+        ------------------------------------------------------------------------
+        | sample                 | Probability (0 to 1) that a record is kept. |
+        |                        | At logger level, the calls of the logging   |
+        |                        | methods of this module are sampled before   |
+        |                        | the record is even created                  |
+        ------------------------------------------------------------------------
+        | rateLimit              | A token bucket per call site (logger, level,|
+        |                        | file and line), such as `{"per_second": 100,|
+        |                        | "burst": 500}`; records over the rate are   |
+        |                        | suppressed before their message is rendered |
+        ------------------------------------------------------------------------
+        | suppressedSummary      | At most every this many seconds (default    |
+        |                        | 60), the next record is preceded by one     |
+        |                        | reporting how many records were suppressed  |
+        |                        | by `sample` and `rateLimit`, 0 disables it  |
+        ------------------------------------------------------------------------
+        | collapseDuplicates     | Handlers drop a record identical to the     |
+        |                        | previous one (same logger, level, call site |
+        |                        | and message) within this many seconds (True |
+        |                        | means 60) of the first one, and write "last |
+        |                        | message repeated N times" when a different  |
+        |                        | record arrives, when the window is over (by |
+        |                        | a timer) or at exit                         |
+        ------------------------------------------------------------------------
+        | tailBuffer             | Handlers keep up to this many records below |
+        |                        | their level per thread or asyncio task, not |
+        |                        | formatted. A record at or above level       |
+        |                        | `tailBufferTrigger` (default "ERROR") writes|
+        |                        | them first; otherwise they are dropped. Set |
+        |                        | the logger level low enough (e.g. "DEBUG")  |
+        |                        | for these records to be created             |
+        ------------------------------------------------------------------------
+        | stats                  | Count records emitted and dropped per level |
+        |                        | by the logger and each handler, bytes       |
+        |                        | formatted, errors passed to `handleError`   |
+        |                        | and the depth of async queues, see `stats`  |
+        ------------------------------------------------------------------------
+        | statsSample            | The fraction of records whose format and    |
+        |                        | emit time is measured (default 0.01)        |
+        ------------------------------------------------------------------------
+        | statsInterval          | Every this many seconds, log the stats of   |
+        |                        | the logger at level INFO, default 0 (never) |
+        ------------------------------------------------------------------------
+        | oneline                | The default of parameter `oneline` of the   |
+        |                        | logging methods for this logger             |
+        ------------------------------------------------------------------------
+        | linesep                | The default of parameter `linesep` of the   |
+        |                        | logging methods for this logger             |
+        ------------------------------------------------------------------------
+        | maxMessageLength       | Messages of the logging methods longer than |
+        |                        | this many characters are cut and end with   |
+        |                        | "...", the remaining arguments are not even |
+        |                        | converted to strings. Default 0 (no limit)  |
+        ------------------------------------------------------------------------
+        | formatOutsideLock      | Handlers format records on the calling      |
+        |                        | thread before taking their lock, which then |
+        |                        | only covers writing the line. Less waiting  |
+        |                        | when many threads log to the same handler   |
+        ------------------------------------------------------------------------
         | ...                    | ...                                         |
         ------------------------------------------------------------------------
 
@@ -207,6 +357,44 @@ def __init__(
         `logging.handlers` modules. Other fields will be used as parameters or
         options.
 
+        The rotating handlers (`RotatingFileHandler`, `TimedRotatingFileHandler`)
+        additionally accept the field "compress", one of "gzip", "bz2" and
+        "xz", and optionally "compresslevel". Rolled files are compressed by a
+        background thread, logging never waits for it, and "backupCount" counts
+        the compressed files.
+
+        In addition, this module provides the following handlers, which can be
+        specified by "name" in the same way:
+
+        ============================== HANDLERS ================================
+        | Name                | Description                                    |
+        ------------------------------------------------------------------------
+        | BufferedFileHandler | A `FileHandler` that buffers encoded records   |
+        |                     | and writes them in large chunks. Parameters:   |
+        |                     | `buffer_bytes` (default 65536), write when the |
+        |                     | buffer reaches this size; `flush_interval`     |
+        |                     | (default 1), write every this many seconds, 0  |
+        |                     | disables it; `flush_level` (default "ERROR"),  |
+        |                     | write immediately for records at or above this |
+        |                     | level. The buffer is also written on close     |
+        ------------------------------------------------------------------------
+        | MmapFileHandler     | A `FileHandler` that copies encoded records    |
+        |                     | into a memory-mapped segment of the file.      |
+        |                     | Parameter `segment_bytes` (default 16 MiB), the|
+        |                     | file grows by this size at a time, and is      |
+        |                     | truncated to the data on close. If the process |
+        |                     | is killed, the data ends before the first zero |
+        |                     | byte. `encoding` defaults to "UTF-8" and must  |
+        |                     | not produce zero bytes                         |
+        ------------------------------------------------------------------------
+        | BinaryFileHandler   | A `FileHandler` that writes records unformatted|
+        |                     | in a compact binary format: the time, level,   |
+        |                     | call site and the message arguments as passed. |
+        |                     | The formatter is not used, read the file with  |
+        |                     | `python -m gqylpy_log.decode`, which filters   |
+        |                     | and formats the records                        |
+        ------------------------------------------------------------------------
+
     @param gname:
         If not None, a pointer named `gname` will be created in the current
         module, pointing to the newly created `logging.Logger` instance. This
@@ -233,14 +421,17 @@ def __call__(
         A string inserted between log messages, defaulting to a space.
 
     @param oneline:
-        Make the output log content always one line, defaulting to False. If the
-        log message is multi-line, line breaks will be replaced with the
-        character specified by the `linesep` parameter.
+        Make the output log content always one line, defaulting to False (or to
+        option `oneline` of the logger). If the log message is multi-line, line
+        breaks ("\n", "\r\n" or "\r") and the blanks around them will be
+        replaced with the character specified by the `linesep` parameter, and
+        blank lines are removed.
 
     @param linesep:
         This parameter is used in conjunction with another parameter `oneline`.
         It specifies the string used to replace line breaks, with a default
-        value of a semicolon followed by a space "; ".
+        value of a semicolon followed by a space "; " (or option `linesep` of
+        the logger).
 
     @param gname:
         When `gname` is None, the default logger will be called. If it's not
@@ -339,6 +530,221 @@ def fatal(
     __call__(*msg, sep=sep, oneline=oneline, linesep=linesep, gname=gname, **kw)
 
 
+async def __acall__(
+        *msg:    Any,
+        sep:     Optional[str]    = None,
+        oneline: Optional[bool]   = None,
+        linesep: Optional[str]    = None,
+        gname:   Optional[Logger] = None,
+        **kw
+) -> None:
+    """
+    Record a log entry from a coroutine, without blocking the event loop.
+
+    The parameters are the same as `__call__`. The log record is created on
+    the calling thread, so the caller information is correct, and the log
+    messages are rendered immediately. The record is then put into a queue
+    and handled by a background writer thread. When the queue is full (10000
+    records), the coroutine waits for free space, the event loop itself is
+    never blocked.
+
+    Use `aflush` to wait for the queued records to be written, for example
+    during graceful shutdown.
+    """
+
+
+async def adebug(
+        *msg:    Any,
+        sep:     Optional[str]    = None,
+        oneline: Optional[bool]   = None,
+        linesep: Optional[str]    = None,
+        gname:   Optional[Logger] = None,
+        **kw
+) -> None:
+    await __acall__(
+        *msg, sep=sep, oneline=oneline, linesep=linesep, gname=gname, **kw
+    )
+
+
+async def ainfo(
+        *msg:    Any,
+        sep:     Optional[str]    = None,
+        oneline: Optional[bool]   = None,
+        linesep: Optional[str]    = None,
+        gname:   Optional[Logger] = None,
+        **kw
+) -> None:
+    await __acall__(
+        *msg, sep=sep, oneline=oneline, linesep=linesep, gname=gname, **kw
+    )
+
+
+async def awarning(
+        *msg:    Any,
+        sep:     Optional[str]    = None,
+        oneline: Optional[bool]   = None,
+        linesep: Optional[str]    = None,
+        gname:   Optional[Logger] = None,
+        **kw
+) -> None:
+    await __acall__(
+        *msg, sep=sep, oneline=oneline, linesep=linesep, gname=gname, **kw
+    )
+
+
+async def aerror(
+        *msg:    Any,
+        sep:     Optional[str]    = None,
+        oneline: Optional[bool]   = None,
+        linesep: Optional[str]    = None,
+        gname:   Optional[Logger] = None,
+        **kw
+) -> None:
+    await __acall__(
+        *msg, sep=sep, oneline=oneline, linesep=linesep, gname=gname, **kw
+    )
+
+
+async def aexception(
+        *msg:    Any,
+        sep:     Optional[str]    = None,
+        oneline: Optional[bool]   = None,
+        linesep: Optional[str]    = None,
+        gname:   Optional[Logger] = None,
+        **kw
+) -> None:
+    await __acall__(
+        *msg, sep=sep, oneline=oneline, linesep=linesep, gname=gname, **kw
+    )
+
+
+async def acritical(
+        *msg:    Any,
+        sep:     Optional[str]    = None,
+        oneline: Optional[bool]   = None,
+        linesep: Optional[str]    = None,
+        gname:   Optional[Logger] = None,
+        **kw
+) -> None:
+    await __acall__(
+        *msg, sep=sep, oneline=oneline, linesep=linesep, gname=gname, **kw
+    )
+
+
+async def afatal(
+        *msg:    Any,
+        sep:     Optional[str]    = None,
+        oneline: Optional[bool]   = None,
+        linesep: Optional[str]    = None,
+        gname:   Optional[Logger] = None,
+        **kw
+) -> None:
+    await __acall__(
+        *msg, sep=sep, oneline=oneline, linesep=linesep, gname=gname, **kw
+    )
+
+
+async def aflush() -> None:
+    """
+    Wait until all records of the coroutine logging methods (`ainfo`, ...)
+    have been handled, and the records queued so far by the async handlers
+    (option `async`) too, then flush the handlers.
+    """
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """
+    A snapshot of the counters of the loggers created with option `stats`,
+    keyed by logger name. For example:
+
+        {"myapp": {
+            "emitted":  {"INFO": 1024, "ERROR": 2},
+            "dropped":  {"DEBUG": 10},
+            "handlers": [{
+                "handler":    "AsyncQueueHandler",
+                "name":       None,
+                "emitted":    {"INFO": 1024, "ERROR": 2},
+                "dropped":    {},
+                "bytes":      0,
+                "errors":     0,
+                "formatTime": None,
+                "emitTime":   1.2e-06,
+                "queueDepth": 3,
+                "queueDropped": 0
+            }, {
+                "handler":    "FileHandler",
+                ...
+            }]
+        }}
+
+    `formatTime` and `emitTime` are the average seconds per record, measured
+    on a sample of the records (option `statsSample`); emitting includes
+    formatting. `queueDepth` and `queueDropped` are only reported by async
+    handlers.
+    """
+
+
+def reconfigure(
+        gname:     Optional[Logger]        = None,
+        *,
+        level:     Optional[Level]         = None,
+        formatter: Optional[Formatter]     = None,
+        filters:   Optional[List[Filter]]  = None,
+        options:   Optional[Options]       = None,
+        handlers:  Optional[List[Handler]] = None
+) -> logging.Logger:
+    """Change the configuration of a logger created by `__init__` while it is
+    in use, without creating a new logger.
+
+    The parameters are those of `__init__`, the ones not given (or None) keep
+    their current value. For example:
+
+        >>> glog.reconfigure("alpha", level="DEBUG")
+        >>> glog.reconfigure("alpha", formatter={"fmt": "%(message)s"})
+
+    Handlers created from the same parameters (same class and file, other
+    than "level", "formatter", "filters" and "options") are kept with their
+    open files, and async handlers keep their queue if the queue options are
+    unchanged. The other handlers are created, and the handlers no longer used
+    are closed. The list of handlers of the logger is replaced at once,
+    without a lock taken when logging: a record goes either to the old
+    handlers or to the new ones. The kept handlers are changed in place (their
+    level, formatter and filters), so a record handled by one of them while
+    `reconfigure` runs may see some of its old settings and some of the new.
+
+    @param gname:
+        The logger, its `gname` or the `logging.Logger` instance. Defaults to
+        the default logger.
+    """
+
+
+def watch_config(file: str, *, interval: float = 1) -> Callable[[], None]:
+    """Configure loggers from a JSON or TOML (ending with ".toml") file, and
+    apply the file again each time it changes. Changes are detected by polling
+    its modification time every `interval` seconds.
+
+    The file maps each `gname` to the parameters of `__init__`, "name"
+    defaults to the `gname`:
+
+        {
+            "alpha": {
+                "level": "INFO",
+                "formatter": {"fmt": "[%(asctime)s] %(message)s"},
+                "handlers": [{"name": "FileHandler", "filename": "a.log"}]
+            }
+        }
+
+    A logger that already exists is changed with `reconfigure`, with the
+    parameters missing from the file back to their defaults. Other loggers are
+    created with `__init__`. Errors when the file is first read are raised,
+    later errors are printed and the previous configuration stays in use.
+
+    TOML files need Python 3.11 or later, or package `tomli`.
+
+    @return: A function that stops watching the file.
+    """
+
+
 class _xe6_xad_x8c_xe7_x90_xaa_xe6_x80_xa1_xe7_x8e_xb2_xe8_x90_x8d_xe4_xba_x91:
     gpack = globals()
     gcode = __import__(f"{__name__}.g {__name__[7:]}", fromlist=...)
@@ -347,8 +753,10 @@ class _xe6_xad_x8c_xe7_x90_xaa_xe6_x80_xa1_xe7_x8e_xb2_xe8_x90_x8d_xe4_xba_x91:
         if gname[0] != "_" and callable(gfunc):
             del gpack[gname]
 
-    __init__, __getattr__ = gcode.__init__, gcode.__getattr__
-
-    __init__.__module__ = __getattr__.__module__ = __package__
-
-    gpack["__init__"], gpack["__getattr__"] = __init__, __getattr__
+    for gname in (
+            "__init__", "__getattr__", "aflush", "stats", "reconfigure",
+            "watch_config"
+    ):
+        gfunc = getattr(gcode, gname)
+        gfunc.__module__ = __package__
+        gpack[gname] = gfunc
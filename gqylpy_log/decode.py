@@ -0,0 +1,114 @@
+"""
+Decode the log files written by `BinaryFileHandler`:
+
+    $ python -m gqylpy_log.decode [--level LEVEL] [--since TIME] [--until TIME]
+                                  [--logger NAME] [--fmt FMT] [--datefmt FMT]
+                                  [--style STYLE] FILE [FILE ...]
+
+The records are read as a stream, filtered, and formatted like a text log:
+with `--fmt` (a format of `logging`, in `--style` "%", "{", "$" or "json"),
+defaulting to the format of the default logger. A FILE of "-" is the standard
+input. TIME is a Unix timestamp or an ISO 8601 date and time.
+"""
+import sys
+import logging
+import argparse
+import datetime
+
+from typing import BinaryIO, Iterable, Iterator, Optional, Union
+
+import gqylpy_log
+
+gcode = __import__(f"{__package__}.g log", fromlist=...)
+
+
+def decode(
+        files:  Iterable[Union[str, BinaryIO]],
+        level:  Union[int, str, None] = None,
+        since:  Optional[float]       = None,
+        until:  Optional[float]       = None,
+        logger: Optional[str]         = None
+) -> Iterator[logging.LogRecord]:
+    # The records of `files` at or above `level`, created in [since, until),
+    # and of logger `logger` or its children.
+    levelno: int = logging._checkLevel(level) if level is not None else 0
+
+    for file in files:
+        if isinstance(file, str):
+            if file == "-":
+                file = sys.stdin.buffer
+            else:
+                with open(file, "rb") as f:
+                    yield from decode([f], level, since, until, logger)
+                continue
+
+        for record in gcode.read_binary_log(file):
+            if record.levelno < levelno:
+                continue
+            if since is not None and record.created < since:
+                continue
+            if until is not None and record.created >= until:
+                continue
+            if logger is not None and record.name != logger and \
+                    not record.name.startswith(logger + "."):
+                continue
+            yield record
+
+
+def parse_time(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def main(argv: Optional[list] = None) -> None:
+    formatter_params: dict = gqylpy_log.default["formatter"]
+
+    parser = argparse.ArgumentParser(
+        prog=f"python -m {__package__}.decode",
+        description=__doc__.strip().split("\n\n")[0].strip(":")
+    )
+    parser.add_argument("files", nargs="+", metavar="FILE")
+    parser.add_argument("--level", help="the lowest level, e.g. WARNING")
+    parser.add_argument("--since", type=parse_time, metavar="TIME")
+    parser.add_argument("--until", type=parse_time, metavar="TIME")
+    parser.add_argument("--logger", help="a logger name, with its children")
+    parser.add_argument("--fmt", default=formatter_params["fmt"])
+    parser.add_argument("--datefmt", default=formatter_params.get("datefmt"))
+    parser.add_argument(
+        "--style", default="%", choices=("%", "{", "$", "json")
+    )
+    args = parser.parse_args(argv)
+
+    level: Union[int, str, None] = args.level
+    if level is not None and level.isdigit():
+        level = int(level)
+
+    if args.style == "json":
+        formatter: logging.Formatter = gcode.create_formatter(
+            {"style": "json", "datefmt": args.datefmt}
+        )
+    else:
+        formatter: logging.Formatter = gcode.create_formatter({
+            "fmt":      args.fmt,
+            "datefmt":  args.datefmt,
+            "style":    args.style,
+            "compiled": args.style == "%"
+        })
+
+    write = sys.stdout.write
+    try:
+        for record in decode(
+                args.files, level, args.since, args.until, args.logger
+        ):
+            write(formatter.format(record) + "\n")
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # Piped into `head` and the like.
+        sys.stderr.close()
+
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(errors="backslashreplace")
+    main()
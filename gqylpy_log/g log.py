@@ -13,19 +13,36 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import io
 import os
+import math
+import re
 import sys
+import time
+import atexit
+import collections
 import logging
+import operator
+import itertools
+import threading
+import weakref
+import traceback
 
-from logging import handlers as logging_handlers
-
-from types import ModuleType
+from types import ModuleType, CodeType
 
 from typing import (
     TypeVar, Type, Final, Optional, TypedDict, Union, Callable, Mapping, Dict,
-    List, Any
+    List, Tuple, Deque, Iterator, BinaryIO, Any, TYPE_CHECKING
 )
 
+if TYPE_CHECKING:
+    # Imported where they are used, only by the features that need them.
+    import mmap
+    import queue
+    import struct
+    from logging import handlers as logging_handlers
+    from multiprocessing import connection as multiprocessing_connection
+
 if sys.version_info >= (3, 9):
     from typing import Annotated
 else:
@@ -49,13 +66,37 @@ class DictFormatter(TypedDict, total=False):
     datefmt:  str
     style:    str
     validate: bool
+    compiled: bool
+    fields:   List[str]
 
     if sys.version_info >= (3, 10):
         defaults: Mapping[str, Any]
 
 
-class Options(TypedDict, total=False):
-    onlyRecordCurrentLevel: bool
+# Functional syntax, "async" is a keyword.
+Options = TypedDict("Options", {
+    "onlyRecordCurrentLevel": bool,
+    "async":                  bool,
+    "asyncQueueSize":         int,
+    "asyncOverflow":          str,
+    "findCaller":             str,
+    "collector":              Union[str, List[Any]],
+    "collectorAuthkey":       str,
+    "collectorLinger":        float,
+    "sample":                 float,
+    "rateLimit":              Dict[str, float],
+    "suppressedSummary":      float,
+    "collapseDuplicates":     Union[bool, float],
+    "tailBuffer":             int,
+    "tailBufferTrigger":      Level,
+    "stats":                  bool,
+    "statsSample":            float,
+    "statsInterval":          float,
+    "oneline":                bool,
+    "linesep":                str,
+    "maxMessageLength":       int,
+    "formatOutsideLock":      bool
+}, total=False)
 
 
 Formatter: TypeAlias = Union[DictFormatter, logging.Formatter]
@@ -71,10 +112,6 @@ default: Annotated[logging.Logger, "built-in default logger"]
 gpack: Final[ModuleType] = sys.modules[__package__]
 gcode: Final[ModuleType] = sys.modules[__name__]
 
-logging_handlers.Handler       = logging.Handler
-logging_handlers.StreamHandler = logging.StreamHandler
-logging_handlers.FileHandler   = logging.FileHandler
-
 
 def __init__(
         name:      str,
@@ -87,29 +124,96 @@ def __init__(
         gname:     Optional[str] = None
 ) -> logging.Logger:
     logger = logging.Logger(name, level)
+    logger_configs[logger] = {
+        "level":     level,
+        "formatter": formatter,
+        "filters":   filters,
+        "options":   options,
+        "handlers":  handlers
+    }
+
+    the_handlers, options = \
+        build_handlers(name, level, formatter, filters, options, handlers)
+    for handler in the_handlers:
+        logger.addHandler(handler)
+
+    configure_logger(logger, options)
+
+    if gname:
+        if not hasattr(gcode, "default") or gcode.default.name == "default":
+            gcode.default = logger
+            registry.pop(None, None)
+        setattr(gpack, gname, logger)
+        registry.pop(gname, None)
+
+    return logger
+
+
+def build_handlers(
+        name:      str,
+        level:     Level,
+        formatter: Formatter,
+        filters:   List[Filter],
+        options:   Options,
+        handlers:  List[Handler],
+        reusable:  Optional[Dict[Any, logging.Handler]]           = None,
+        listeners: Optional[Dict[Tuple[int, str], logging.Handler]] = None
+) -> Tuple[List[logging.Handler], Options]:
+    # The handlers to attach to the logger, and the options left to the logger.
+    # Handlers in `reusable` (keyed by `handler_key`) and the queue handlers in
+    # `listeners` (keyed by queue size and overflow) are taken instead of
+    # creating equal ones, see `reconfigure`.
+    if reusable is None:
+        reusable = {}
+
+    if options.get("collector") is not None:
+        # This process only sends its records, the handlers are created in
+        # the collector process.
+        handlers = [CollectorHandler(name, level, formatter, options, handlers)]
+        options = {
+            k: v for k, v in options.items() if k in collector_local_options
+        }
+
+    # Formatters created from equal parameters are one formatter.
+    formatters: Dict[str, logging.Formatter] = {}
+
+    def get_formatter(params: DictFormatter) -> logging.Formatter:
+        key: str = repr(sorted(params.items()))
+        if key not in formatters:
+            formatters[key] = create_formatter(params)
+        return formatters[key]
 
     if isinstance(formatter, dict):
-        formatter = logging.Formatter(**formatter)
+        formatter = get_formatter(formatter)
+
+    attached:     List[logging.Handler]                         = []
+    async_groups: Dict[Tuple[int, str], List[logging.Handler]] = {}
+    # (handler, options, created here), attached once all are built.
+    built: List[Tuple[logging.Handler, Options, bool]] = []
 
     for handler_or_params in handlers:
         if isinstance(handler_or_params, logging.Handler):
-            if handler_or_params.level == 0:
-                handler_or_params.setLevel(level)
-            if handler_or_params.formatter is None:
-                handler_or_params.setFormatter(formatter)
-            for x in filters:
-                handler_or_params.addFilter(x)
-            if options.get("onlyRecordCurrentLevel"):
-                handler_or_params.filters.append(
-                    only_record_current_level(handler_or_params.level)
-                )
-            logger.addHandler(handler_or_params)
+            handler: logging.Handler = handler_or_params
+            if handler in handler_origins:
+                reset_handler(handler)
+            else:
+                handler_origins[handler] = \
+                    handler.level, handler.formatter, list(handler.filters)
+            the_level, the_formatter, the_filters = handler_origins[handler]
+            handler.setLevel(the_level or level)
+            handler.setFormatter(the_formatter or formatter)
+            handler.filters = \
+                handler_filters(handler, the_filters + filters, options)
+            built.append((handler, options, False))
             continue
 
+        # Not changed, it is kept by `reconfigure`.
+        handler_or_params = dict(handler_or_params)
+
         if "formatter" in handler_or_params:
             the_formatter: Formatter = handler_or_params.pop("formatter")
             if the_formatter.__class__ is dict:
-                the_formatter = logging.Formatter(**the_formatter)
+                the_formatter = get_formatter(the_formatter)
         else:
             the_formatter = formatter
 
@@ -118,82 +222,3059 @@ def __init__(
         the_options: Options      = handler_or_params.pop("options", options)
 
         handler_type: Type[logging.Handler] = \
-            getattr(logging_handlers, handler_or_params.pop("name"))
+            get_handler_type(handler_or_params.pop("name"))
+
+        key: Any = handler_key(handler_type, handler_or_params)
+        handler: Optional[logging.Handler] = reusable.pop(key, None)
+
+        if handler is not None:
+            reset_handler(handler)
+        else:
+            compress:      Optional[str] = \
+                handler_or_params.pop("compress", None)
+            compresslevel: Optional[int] = \
+                handler_or_params.pop("compresslevel", None)
+
+            if issubclass(handler_type, logging.FileHandler):
+                filename: str = handler_or_params["filename"]
+                logdir:   str = os.path.dirname(os.path.abspath(filename))
+                os.makedirs(logdir, exist_ok=True)
 
-        if issubclass(handler_type, logging.FileHandler):
-            filename: str = handler_or_params["filename"]
-            logdir:   str = os.path.dirname(os.path.abspath(filename))
-            os.makedirs(logdir, exist_ok=True)
+            handler = handler_type(**handler_or_params)
+            if compress is not None:
+                set_compression(handler, compress, compresslevel)
+            handler_keys[handler] = key
 
-        handler: logging.Handler = handler_type(**handler_or_params)
+        set_bytes_emit(handler)
         handler.setLevel(the_level)
         handler.setFormatter(the_formatter)
-        for x in the_filters:
-            handler.addFilter(x)
-        if the_options.get("onlyRecordCurrentLevel"):
-            handler.filters.append(only_record_current_level(handler.level))
+        handler.filters = handler_filters(handler, the_filters, the_options)
+        # Options inherited from the logger are applied to the logger.
+        if the_options is not options:
+            add_suppression_filter(handler, the_options)
+        built.append((handler, the_options, True))
 
-        logger.addHandler(handler)
+    # The handlers created here with the same formatter, created here too,
+    # share the text of a record, see `share_format`.
+    sharing: collections.Counter = collections.Counter(
+        handler.formatter for handler, _, created in built
+        if created and handler.formatter in formatters.values()
+    )
+    last_texts: Dict[logging.Formatter, list] = {}
+
+    for handler, the_options, created in built:
+        if created and sharing[handler.formatter] > 1:
+            share_format(handler, last_texts.setdefault(
+                handler.formatter, [(None, None)]
+            ))
+        set_format_outside_lock(handler, the_options)
+        attach_handler(attached, async_groups, handler, the_options)
+
+    for (queue_size, overflow), the_handlers in async_groups.items():
+        handler: Optional[AsyncQueueHandler] = \
+            (listeners or {}).pop((queue_size, overflow), None)
+        if handler is None:
+            handler = start_queue_listener(the_handlers, queue_size, overflow)
+        else:
+            reset_handler(handler)
+            handler.listener.handlers = tuple(the_handlers)
+            handler.setLevel(min(x.level for x in the_handlers))
+        attached.append(handler)
+
+    return attached, options
+
+
+def share_format(handler: logging.Handler, last: list) -> None:
+    # The handlers with the same formatter render a record once per logging
+    # call: the text of the last record is kept in `last`, shared by them. A
+    # handler with filters of its own (which may change the record) formats
+    # the record itself, and the kept text is dropped for the handlers after
+    # it.
+    the_format: Callable[[logging.LogRecord], str] = handler.format
+
+    def format(record: logging.LogRecord) -> str:
+        for x in handler.filters:
+            if x.__class__ not in record_preserving_filters:
+                last[0] = None, None
+                return the_format(record)
+        ref, text = last[0]
+        if ref is not None and ref() is record:
+            return text
+        text = the_format(record)
+        last[0] = weakref.ref(record), text
+        return text
+
+    install(handler, "format", format)
+
+
+def record_bytes(
+        handler:  logging.Handler,
+        record:   logging.LogRecord,
+        encoding: str,
+        errors:   str
+) -> bytes:
+    # The formatted record and the terminator, encoded. The text of a shared
+    # formatter is the same object for each handler, it is encoded once.
+    text:       str = handler.format(record)
+    terminator: str = handler.terminator
+    x: tuple = last_encoded[0]
+    if x[0] is text and x[1] == terminator and x[2] == encoding and \
+            x[3] == errors:
+        return x[4]
+    data: bytes = (text + terminator).encode(encoding, errors)
+    last_encoded[0] = text, terminator, encoding, errors, data
+    return data
+
+
+# (text, terminator, encoding, errors, bytes) of the last encoded record.
+last_encoded: Final[List[tuple]] = [(None, None, None, None, None)]
+
+
+def set_bytes_emit(handler: logging.Handler) -> None:
+    # `FileHandler` and the rotating handlers write `record_bytes` to the
+    # binary file behind their text file, the text file is only flushed. Not
+    # where the text file translates line breaks, nor for encodings writing a
+    # byte order mark first.
+    if os.linesep != "\n":
+        return
+
+    emit: Callable = handler.__class__.emit
+    rotating: Optional[ModuleType] = sys.modules.get("logging.handlers")
+    if emit is logging.FileHandler.emit:
+        should_rollover: Optional[Callable] = None
+    elif rotating is not None and emit is rotating.BaseRotatingHandler.emit:
+        should_rollover = handler.shouldRollover
+    else:
+        return
+
+    encoding: str = handler.encoding
+    if encoding is None or encoding == "locale":
+        import locale
+        encoding = locale.getpreferredencoding(False)
+    try:
+        if "".encode(encoding):
+            return
+    except LookupError:
+        return
+    errors: str = getattr(handler, "errors", None) or "strict"
+
+    def emit(record: logging.LogRecord) -> None:
+        try:
+            if should_rollover is not None and should_rollover(record):
+                handler.doRollover()
+            if handler.stream is None:
+                if handler.mode == "w" and getattr(handler, "_closed", False):
+                    return
+                handler.stream = handler._open()
+            handler.stream.buffer.write(
+                record_bytes(handler, record, encoding, errors)
+            )
+            handler.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            handler.handleError(record)
+
+    install(handler, "emit", emit)
+
+
+def configure_logger(logger: logging.Logger, options: Options) -> None:
+    # The options applied to the logger itself, after its handlers are added.
+    add_suppression_filter(logger, options)
+
+    find_caller: Optional[str] = options.get("findCaller")
+    if find_caller is not None:
+        set_find_caller(logger, find_caller)
+
+    if options.get("stats"):
+        enable_stats(logger, options)
+
+    if "oneline" in options or "linesep" in options or \
+            "maxMessageLength" in options:
+        message_defaults[logger] = (
+            options.get("oneline", False),
+            options.get("linesep", "; "),
+            options.get("maxMessageLength", 0)
+        )
+
+
+def handler_filters(
+        handler: logging.Handler,
+        filters: List[Filter],
+        options: Options
+) -> List[Filter]:
+    # The filters of a handler, assigned at once so that a handler in use never
+    # runs part of them.
+    result: List[Filter] = []
+    for x in filters:
+        if x not in result:
+            result.append(x)
+    if options.get("onlyRecordCurrentLevel"):
+        result.append(OnlyRecordCurrentLevel(handler.level))
+    window: Union[bool, float, None] = options.get("collapseDuplicates")
+    if window:
+        result.append(
+            DuplicateFilter(handler, 60 if window is True else window)
+        )
+    return result
+
+
+def handler_key(
+        handler_type: Type[logging.Handler],
+        params:       Dict[str, Any]
+) -> Tuple[Type[logging.Handler], str]:
+    # Handlers created from equal parameters are interchangeable: the same
+    # file, opened the same way.
+    params = dict(params)
+    if "filename" in params:
+        params["filename"] = os.path.abspath(params["filename"])
+    return handler_type, repr(sorted(params.items()))
+
+
+def reset_handler(handler: logging.Handler) -> None:
+    # Undo what `install` did before the handler is configured again: what the
+    # caller set on the instance is put back. `setLevel` is kept, it is watched
+    # by the registry.
+    for name, original in installed.pop(handler, {}).items():
+        if original is None:
+            handler.__dict__.pop(name, None)
+        else:
+            handler.__dict__[name] = original
 
-    if gname:
-        if not hasattr(gcode, "default") or gcode.default.name == "default":
-            gcode.default = logger
-        setattr(gpack, gname, logger)
+
+def install(handler: logging.Handler, name: str, function: Callable) -> None:
+    # Sets a method such as `emit` on the handler instance, the first time
+    # keeping what was there for `reset_handler`.
+    installed.setdefault(handler, {}).setdefault(
+        name, handler.__dict__.get(name)
+    )
+    handler.__dict__[name] = function
+
+
+# The methods set on each handler instance by `install`, with what they
+# replaced (None if the class method).
+installed: Final[
+    "weakref.WeakKeyDictionary[logging.Handler, Dict[str, Optional[Callable]]]"
+] = weakref.WeakKeyDictionary()
+
+
+def reconfigure(
+        gname:     Optional[Logger]       = None,
+        *,
+        level:     Optional[Level]        = None,
+        formatter: Optional[Formatter]    = None,
+        filters:   Optional[List[Filter]] = None,
+        options:   Optional[Options]      = None,
+        handlers:  Optional[List[Handler]] = None
+) -> logging.Logger:
+    logger: logging.Logger = get_logger(gname)
+
+    config: Optional[Dict[str, Any]] = logger_configs.get(logger)
+    if config is None:
+        raise ValueError(
+            f"logger {logger.name!r} was not created by '{__package__}'."
+        )
+    config = dict(config)
+    for k, v in (
+            ("level", level), ("formatter", formatter), ("filters", filters),
+            ("options", options), ("handlers", handlers)
+    ):
+        if v is not None:
+            config[k] = v
+
+    # The handlers of the logger that can be taken again, the others are
+    # closed once the new ones are in place.
+    reusable: Dict[Any, logging.Handler] = {}
+    for handler in inner_handlers(logger.handlers):
+        reusable[handler_keys.get(handler, handler)] = handler
+    listeners: Dict[Tuple[int, str], AsyncQueueHandler] = {
+        (getattr(x.queue, "maxsize", 0), x.overflow): x
+        for x in logger.handlers if x.__class__ is AsyncQueueHandler
+    }
+    old_handlers: List[logging.Handler] = logger.handlers
+
+    the_handlers, the_options = build_handlers(
+        logger.name, config["level"], config["formatter"], config["filters"],
+        config["options"], config["handlers"], reusable, listeners
+    )
+
+    # Each assignment is atomic, a record being handled sees either the old
+    # or the new handlers.
+    logger.handlers = the_handlers
+    logger.filters  = [
+        x for x in logger.filters if x.__class__ is not SuppressionFilter
+    ]
+    for x in "findCaller", "filter":
+        logger.__dict__.pop(x, None)
+    message_defaults.pop(logger, None)
+    previous: Optional[LoggerStats] = stats_registry.pop(logger.name, None)
+    if previous is not None:
+        previous.stopped.set()
+
+    configure_logger(logger, the_options)
+    logger.setLevel(config["level"])
+    logger_configs[logger] = config
+
+    for x, entry in list(registry.items()):
+        if entry.logger is logger:
+            registry.pop(x, None)
+    logger_registry.pop(logger, None)
+    invalidate_registry()
+
+    # Queues no longer used are drained into their handlers, then the handlers
+    # no longer used are closed.
+    def queue_handlers(handlers: List[logging.Handler]) -> list:
+        return [
+            x.target if x.__class__ is TailBufferHandler else x
+            for x in handlers
+        ]
+
+    in_use: list = queue_handlers(the_handlers)
+    for handler in queue_handlers(old_handlers):
+        if handler.__class__ is AsyncQueueHandler and handler not in in_use:
+            handler.listener.stop()
+            if handler.listener in queue_listeners:
+                queue_listeners.remove(handler.listener)
+    in_use = inner_handlers(the_handlers)
+    for handler in reusable.values():
+        if handler not in in_use:
+            handler.close()
 
     return logger
 
 
-def only_record_current_level(
-        levelno: int
-) -> Callable[[logging.LogRecord], bool]:
-    return lambda record: record.levelno == levelno
+# The configuration of the loggers created by `__init__`, completed by
+# `reconfigure`.
+logger_configs: Final[
+    "weakref.WeakKeyDictionary[logging.Logger, Dict[str, Any]]"
+] = weakref.WeakKeyDictionary()
 
+# How each handler was created from parameters, see `handler_key`.
+handler_keys: Final[
+    "weakref.WeakKeyDictionary[logging.Handler, Any]"
+] = weakref.WeakKeyDictionary()
 
-def __getattr__(method: str) -> Closure:
-    if not hasattr(logging.Logger, method):
-        raise AttributeError(
-            f"module '{__package__}' has no attribute '{method}'"
+# The level, formatter and filters of the handler instances passed to
+# `__init__`, before it configured them.
+handler_origins: Final[
+    "weakref.WeakKeyDictionary[logging.Handler, Tuple[int, Any, list]]"
+] = weakref.WeakKeyDictionary()
+
+
+def watch_config(file: str, *, interval: float = 1) -> Callable[[], None]:
+    # The configuration is applied now, errors are raised to the caller. Later
+    # errors are printed, and the previous configuration is kept until the
+    # file changes again.
+    mtime: int = os.stat(file).st_mtime_ns
+    apply_config(file)
+
+    stopped = threading.Event()
+
+    def watch() -> None:
+        nonlocal mtime
+        while not stopped.wait(interval):
+            try:
+                the_mtime: int = os.stat(file).st_mtime_ns
+            except OSError:
+                continue
+            if the_mtime == mtime:
+                continue
+            mtime = the_mtime
+            try:
+                apply_config(file)
+            except Exception:
+                if logging.raiseExceptions:
+                    traceback.print_exc()
+
+    threading.Thread(
+        target=watch, name=f"{watch_config.__name__}-{file}", daemon=True
+    ).start()
+
+    return stopped.set
+
+
+def apply_config(file: str) -> None:
+    # Each logger in the file is configured in full, the parameters not given
+    # take the defaults of `__init__`.
+    if file.endswith(".toml"):
+        if sys.version_info >= (3, 11):
+            import tomllib
+        else:
+            try:
+                import tomli as tomllib
+            except ModuleNotFoundError:
+                raise ModuleNotFoundError(
+                    "TOML configuration files need module 'tomli' before "
+                    "Python 3.11, please run 'pip install tomli'."
+                ) from None
+        with open(file, "rb") as f:
+            config: Dict[str, Any] = tomllib.load(f)
+    else:
+        import json
+        with open(file, encoding="UTF-8") as f:
+            config: Dict[str, Any] = json.load(f)
+
+    if not isinstance(config, dict) or not all(
+            isinstance(x, dict) for x in config.values()
+    ):
+        raise ValueError(
+            f"configuration file {file!r} must map each gname to the "
+            f"parameters of its logger."
         )
 
-    def logger(
-            *msg,
-            sep:     str              = " ",
-            oneline: bool             = False,
-            linesep: str              = "; ",
-            gname:   Optional[Logger] = None,
+    defaults: Dict[str, Any] = __init__.__kwdefaults__
+    for gname, params in config.items():
+        params = dict(params)
+        name: str = params.pop("name", gname)
+        params = {
+            k: params.get(k, defaults[k])
+            for k in ("level", "formatter", "filters", "options", "handlers")
+        }
+        if getattr(gpack, gname, None) in logger_configs:
+            reconfigure(gname, **params)
+        else:
+            __init__(name, **params, gname=gname)
+
+
+def create_formatter(params: DictFormatter) -> logging.Formatter:
+    # "compiled" selects the class, whatever its value it is not passed on.
+    compiled: bool = params.get("compiled", False)
+    params = {k: v for k, v in params.items() if k != "compiled"}
+    if params.get("style") == "json":
+        # "fmt" is ignored, such as the one of the default formatter: the
+        # output is selected by "fields".
+        params = {
+            k: v for k, v in params.items() if k not in ("style", "fmt")
+        }
+        return JsonFormatter(**params)
+    if compiled:
+        return CompiledFormatter(**params)
+    return logging.Formatter(**params)
+
+
+# Produces exactly the output of `logging.Formatter`. The rendered time is
+# cached per second, and a "%"-style format is compiled into a positional
+# format and the tuple of its fields, so a record is rendered by a single
+# `str.__mod__` call rather than through the record's `__dict__` mapping.
+class CompiledFormatter(logging.Formatter):
+    field_pattern = re.compile(
+        r"%\((\w+)\)([#0+ -]*\d*(?:\.\d+)?[diouxXeEfFgGcrsa])|%%"
+    )
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self.time_cache: Tuple[int, str, Optional[str]] = (-1, "", None)
+        self.compile()
+
+    def compile(self) -> None:
+        self.compiled_fmt:    Optional[str] = None
+        self.compiled_fields: Optional[Callable[[dict], tuple]] = None
+
+        if self._style.__class__ is not logging.PercentStyle:
+            return
+
+        fmt: str = self._style._fmt
+        segments: List[str] = []
+        fields:   List[str] = []
+        position = 0
+
+        for x in self.field_pattern.finditer(fmt):
+            literal: str = fmt[position:x.start()]
+            if "%" in literal:
+                return
+            segments.append(literal)
+            if x.group(1) is None:
+                segments.append("%%")
+            else:
+                segments.append("%" + x.group(2))
+                fields.append(x.group(1))
+            position = x.end()
+
+        literal: str = fmt[position:]
+        if "%" in literal:
+            return
+        segments.append(literal)
+
+        if len(fields) == 1:
+            field: str = fields[0]
+            self.compiled_fields = lambda values: (values[field],)
+        else:
+            self.compiled_fields = operator.itemgetter(*fields) \
+                if fields else lambda values: ()
+
+        self.compiled_fmt = "".join(segments)
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        if self.compiled_fmt is not None:
+            try:
+                return self.compiled_fmt % \
+                    self.compiled_fields(record.__dict__)
+            except KeyError:
+                # Possibly served by the `defaults` of the style.
+                pass
+        return self._style.format(record)
+
+    def formatTime(
+            self,
+            record:  logging.LogRecord,
+            datefmt: Optional[str] = None
+    ) -> str:
+        second = int(record.created)
+        cached_second, cached_time, cached_datefmt = self.time_cache
+
+        if second != cached_second or datefmt != cached_datefmt:
+            cached_time: str = time.strftime(
+                datefmt or self.default_time_format,
+                self.converter(record.created)
+            )
+            self.time_cache = second, cached_time, datefmt
+
+        if datefmt or not self.default_msec_format:
+            return cached_time
+
+        return self.default_msec_format % (cached_time, record.msecs)
+
+
+# Renders one JSON object per record. The keys are encoded once, `str`, `int`
+# and `float` values are encoded directly, other values by `json.dumps` with
+# `str` as fallback. Extra fields (keyword argument `extra`) are appended.
+class JsonFormatter(CompiledFormatter):
+    default_fields: Final[Tuple[str, ...]] = (
+        "asctime", "levelname", "name", "module", "funcName", "lineno",
+        "message"
+    )
+
+    # Attributes every record has, anything else is an extra field.
+    record_attributes: Final[frozenset] = frozenset(
+        logging.LogRecord("", 0, "", 0, "", None, None).__dict__
+    ) | {"message", "asctime"}
+
+    def __init__(
+            self,
+            fields:       Optional[List[str]] = None,
+            datefmt:      Optional[str]       = None,
+            extra:        bool                = True,
+            msg_array:    bool                = False,
+            ensure_ascii: bool                = False,
             **kw
+    ):
+        import json
+        super().__init__(None, datefmt, **kw)
+        self.dumps: Callable[..., str] = json.dumps
+        self.fields: Tuple[str, ...] = \
+            self.default_fields if fields is None else tuple(fields)
+        self.extra        = extra
+        self.msg_array    = msg_array
+        self.ensure_ascii = ensure_ascii
+        self.encode_str: Callable[[str], str] = \
+            json.encoder.encode_basestring_ascii if ensure_ascii else \
+            json.encoder.encode_basestring
+        self.encoded_keys: Tuple[Tuple[str, str], ...] = tuple(
+            (self.encode_str(field) + ":", field) for field in self.fields
+        )
+
+    def usesTime(self) -> bool:
+        return "asctime" in self.fields
+
+    def encode(self, value: Any) -> str:
+        if value.__class__ is str:
+            return self.encode_str(value)
+        if value.__class__ is int:
+            return int.__repr__(value)
+        if value.__class__ is float:
+            if math.isfinite(value):
+                return float.__repr__(value)
+            # NaN and infinities are not JSON.
+            return self.encode_str(float.__repr__(value))
+        if value is None:
+            return "null"
+        try:
+            return self.dumps(
+                value, ensure_ascii=self.ensure_ascii, default=str,
+                allow_nan=False
+            )
+        except ValueError:
+            return self.dumps(
+                non_finite_to_str(value), ensure_ascii=self.ensure_ascii,
+                default=str
+            )
+
+    def encode_message(self, record: logging.LogRecord) -> str:
+        if not self.msg_array:
+            return self.encode_str(record.message)
+        if record.msg.__class__ is LazyMessage:
+            msg: tuple = record.msg.msg
+        else:
+            msg: tuple = record.message,
+        return "[" + ",".join(self.encode(m) for m in msg) + "]"
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.message = record.getMessage()
+        if self.usesTime():
+            record.asctime = self.formatTime(record, self.datefmt)
+
+        values: Dict[str, Any] = record.__dict__
+        items: List[str] = []
+
+        for key, field in self.encoded_keys:
+            if field == "message":
+                items.append(key + self.encode_message(record))
+            else:
+                items.append(key + self.encode(values.get(field)))
+
+        if self.extra:
+            for field, value in values.items():
+                if field not in self.record_attributes and \
+                        field not in self.fields:
+                    items.append(
+                        self.encode_str(field) + ":" + self.encode(value)
+                    )
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            items.append('"exc_text":' + self.encode_str(record.exc_text))
+        if record.stack_info:
+            items.append(
+                '"stack_info":' + self.encode_str(
+                    self.formatStack(record.stack_info)
+                )
+            )
+
+        return "{" + ",".join(items) + "}"
+
+
+def non_finite_to_str(value: Any) -> Any:
+    # A copy of `value` with NaN and infinities as strings, "nan", "inf" and
+    # "-inf".
+    if isinstance(value, float):
+        return value if math.isfinite(value) else float.__repr__(value)
+    if isinstance(value, dict):
+        return {k: non_finite_to_str(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [non_finite_to_str(x) for x in value]
+    return value
+
+
+def set_find_caller(logger: logging.Logger, mode: str) -> None:
+    if mode not in find_caller_modes:
+        raise ValueError(
+            f"option 'findCaller' must be one of {find_caller_modes}, "
+            f"not {mode!r}."
+        )
+
+    if mode == "auto":
+        mode = "fast" if uses_caller_info(logger) else "off"
+
+    # Set on the instance, `logging.Logger._log` calls `self.findCaller`.
+    if mode == "off":
+        logger.findCaller = find_no_caller
+    elif sys.version_info >= (3, 11):
+        logger.findCaller = find_caller
+    else:
+        logger.findCaller = find_caller_before_3_11
+
+
+def inner_handlers(handlers: List[logging.Handler]) -> List[logging.Handler]:
+    # The handlers doing the work behind the wrappers created by `__init__`.
+    result: List[logging.Handler] = []
+    for handler in handlers:
+        if handler.__class__ is AsyncQueueHandler:
+            result.extend(inner_handlers(handler.listener.handlers))
+        elif handler.__class__ is TailBufferHandler:
+            result.extend(inner_handlers([handler.target]))
+        else:
+            result.append(handler)
+    return result
+
+
+def uses_caller_info(logger: logging.Logger) -> bool:
+    handlers: List[logging.Handler] = inner_handlers(logger.handlers)
+
+    for x in logger.filters + [x for h in handlers for x in h.filters]:
+        if x.__class__ is OnlyRecordCurrentLevel:
+            continue
+        if x.__class__ is SuppressionFilter and x.per_second is None:
+            continue
+        # A filter may read the caller info, we cannot tell.
+        return True
+
+    for handler in handlers:
+        formatter: Optional[logging.Formatter] = handler.formatter
+        if formatter is None:
+            formatter = logging._defaultFormatter
+        if formatter.__class__ is JsonFormatter:
+            if any(field in formatter.fields for field in caller_fields):
+                return True
+            if formatter.extra:
+                return True
+            continue
+        if formatter.__class__ not in (logging.Formatter, CompiledFormatter):
+            return True
+        if any(field in formatter._fmt for field in caller_fields):
+            return True
+
+    return False
+
+
+def find_caller(
+        stack_info: bool = False,
+        stacklevel: int  = 1
+) -> Tuple[str, int, str, Optional[str]]:
+    # Same walk as `logging.Logger.findCaller` of Python 3.11+, but whether a
+    # frame is internal to `logging` is cached per code object, rather than
+    # normalizing its filename every time.
+    f = sys._getframe(0)
+    while stacklevel > 0:
+        next_f = f.f_back
+        if next_f is None:
+            break
+        f = next_f
+        code = f.f_code
+        try:
+            internal: bool = internal_codes[code]
+        except KeyError:
+            if len(internal_codes) >= 4096:
+                internal_codes.clear()
+            internal = internal_codes[code] = is_internal_frame(f)
+        if not internal:
+            stacklevel -= 1
+
+    code = f.f_code
+    sinfo: Optional[str] = format_stack(f) if stack_info else None
+
+    return code.co_filename, f.f_lineno, code.co_name, sinfo
+
+
+def find_caller_before_3_11(
+        stack_info: bool = False,
+        stacklevel: int  = 1
+) -> Tuple[str, int, str, Optional[str]]:
+    # Same walk as `logging.Logger.findCaller` before Python 3.11, with the
+    # cache of `find_caller`: from the caller of the logging method that called
+    # `Logger._log`, `stacklevel` counts every frame, then the frames internal
+    # to `logging` are skipped.
+    f = orig_f = sys._getframe(3)
+    while f and stacklevel > 1:
+        f = f.f_back
+        stacklevel -= 1
+    if not f:
+        f = orig_f
+
+    while f is not None:
+        code = f.f_code
+        try:
+            internal: bool = internal_codes[code]
+        except KeyError:
+            if len(internal_codes) >= 4096:
+                internal_codes.clear()
+            internal = internal_codes[code] = is_internal_frame(f)
+        if not internal:
+            sinfo: Optional[str] = format_stack(f) if stack_info else None
+            return code.co_filename, f.f_lineno, code.co_name, sinfo
+        f = f.f_back
+
+    return "(unknown file)", 0, "(unknown function)", None
+
+
+def format_stack(f) -> str:
+    with io.StringIO() as sio:
+        sio.write("Stack (most recent call last):\n")
+        traceback.print_stack(f, file=sio)
+        sinfo: str = sio.getvalue()
+    if sinfo[-1] == "\n":
+        sinfo = sinfo[:-1]
+    return sinfo
+
+
+def find_no_caller(
+        stack_info: bool = False,
+        stacklevel: int  = 1
+) -> Tuple[str, int, str, Optional[str]]:
+    if stack_info:
+        # One more level for this frame.
+        return find_caller(stack_info, stacklevel + 1)
+    # The same values as `logging` uses when `logging._srcfile` is None.
+    return "(unknown file)", 0, "(unknown function)", None
+
+
+if sys.version_info >= (3, 11):
+    is_internal_frame = logging._is_internal_frame
+else:
+    def is_internal_frame(frame) -> bool:
+        return os.path.normcase(frame.f_code.co_filename) == logging._srcfile
+
+
+find_caller_modes: Final[Tuple[str, ...]] = "fast", "auto", "off"
+
+caller_fields: Final[Tuple[str, ...]] = \
+    "pathname", "filename", "module", "funcName", "lineno"
+
+internal_codes: Final[Dict[CodeType, bool]] = {}
+
+
+def get_handler_type(name: str) -> Type[logging.Handler]:
+    handler_type = handler_types.get(name)
+    if handler_type is None:
+        # Imported on demand, `logging.handlers` imports `socket`, `pickle`
+        # and more, which the common handlers do not need.
+        from logging import handlers as logging_handlers
+        handler_type = getattr(logging_handlers, name)
+    return handler_type
+
+
+def set_compression(
+        handler:       logging.Handler,
+        codec:         str,
+        compresslevel: Optional[int] = None
+) -> None:
+    from logging import handlers as logging_handlers
+
+    if not isinstance(handler, logging_handlers.BaseRotatingHandler):
+        raise TypeError(
+            f"parameter 'compress' is only supported by rotating handlers, "
+            f"not '{handler.__class__.__name__}'."
+        )
+    if codec not in compress_suffixes:
+        raise ValueError(
+            f"parameter 'compress' must be one of {tuple(compress_suffixes)}, "
+            f"not {codec!r}."
+        )
+
+    suffix: str = compress_suffixes[codec]
+
+    # The rolled file is only renamed on the logging thread, it is compressed
+    # by the background compressor.
+    def rotator(source: str, dest: str) -> None:
+        if not os.path.exists(source):
+            return
+        partial = f"{dest}.{os.getpid()}-{next(partial_numbers)}.part"
+        os.rename(source, partial)
+        compressor.submit(partial, dest, codec, compresslevel)
+
+    handler.namer   = lambda name: name + suffix
+    handler.rotator = rotator
+
+    shift: Optional[Callable[[], None]] = None
+
+    if isinstance(handler, logging_handlers.RotatingFileHandler):
+        # Backups still being compressed are not seen by the shifting of
+        # `doRollover`, they are shifted by the compressor instead.
+        shift = lambda: shift_backups(handler)
+        handler.doRollover = \
+            lambda: rotating_rollover(handler, codec, compresslevel)
+    elif isinstance(handler, logging_handlers.TimedRotatingFileHandler):
+        handler.getFilesToDelete = \
+            lambda: get_files_to_delete(handler, suffix)
+
+    # Files left by a process that exited before compressing them, the oldest
+    # first.
+    dirname, basename = os.path.split(handler.baseFilename)
+    partials: List[str] = [
+        os.path.join(dirname, filename) for filename in os.listdir(dirname)
+        if filename.startswith(basename + ".") and filename.endswith(".part")
+    ]
+    partials.sort(key=os.path.getmtime)
+    for partial in partials:
+        dest: str = partial.rsplit(".", 2)[0]
+        if dest.endswith(suffix):
+            compressor.submit(partial, dest, codec, compresslevel, shift)
+
+
+def rotating_rollover(
+        handler:       "logging_handlers.RotatingFileHandler",
+        codec:         str,
+        compresslevel: Optional[int]
+) -> None:
+    # Like `RotatingFileHandler.doRollover`, without shifting the backups. The
+    # compressor shifts them right before the rolled file becomes backup 1, in
+    # the order the files were rolled.
+    if handler.stream:
+        handler.stream.close()
+        handler.stream = None
+    if handler.backupCount > 0 and os.path.exists(handler.baseFilename):
+        dest: str = handler.rotation_filename(handler.baseFilename + ".1")
+        partial = f"{dest}.{os.getpid()}-{next(partial_numbers)}.part"
+        os.rename(handler.baseFilename, partial)
+        compressor.submit(
+            partial, dest, codec, compresslevel,
+            lambda: shift_backups(handler)
+        )
+    if not handler.delay:
+        handler.stream = handler._open()
+
+
+def shift_backups(handler: "logging_handlers.RotatingFileHandler") -> None:
+    # The shifting of `RotatingFileHandler.doRollover`, run on the compressor
+    # thread.
+    for i in range(handler.backupCount - 1, 0, -1):
+        sfn: str = handler.rotation_filename(f"{handler.baseFilename}.{i}")
+        dfn: str = \
+            handler.rotation_filename(f"{handler.baseFilename}.{i + 1}")
+        if os.path.exists(sfn):
+            os.replace(sfn, dfn)
+
+
+def get_files_to_delete(
+        handler: "logging_handlers.TimedRotatingFileHandler",
+        suffix:  str
+) -> List[str]:
+    # Like `TimedRotatingFileHandler.getFilesToDelete`, counting compressed,
+    # uncompressed and being compressed backups. The latter are the newest,
+    # never deleted.
+    dirname, basename = os.path.split(handler.baseFilename)
+    prefix: str = basename + "."
+    backups: List[str] = []
+
+    for filename in os.listdir(dirname):
+        if not filename.startswith(prefix):
+            continue
+        ext: str = filename[len(prefix):]
+        if ext.endswith(".part"):
+            ext = ext.rsplit(".", 2)[0]
+        if ext.endswith(suffix):
+            ext = ext[:-len(suffix)]
+        if handler.extMatch.match(ext):
+            backups.append(os.path.join(dirname, filename))
+
+    if len(backups) <= handler.backupCount:
+        return []
+
+    backups.sort()
+    return backups[:len(backups) - handler.backupCount]
+
+
+# Compresses the rolled files one at a time on a background thread. Pending
+# files are compressed before the interpreter exits.
+class Compressor:
+
+    def __init__(self):
+        self.queue: Optional["queue.SimpleQueue"] = None
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    def submit(
+            self,
+            partial:       str,
+            dest:          str,
+            codec:         str,
+            compresslevel: Optional[int],
+            shift:         Optional[Callable[[], None]] = None
     ) -> None:
-        if gname is None:
-            if not hasattr(gcode, "default"):
-                __init__("default", **gpack.default, gname="default")
-            gobj: logging.Logger = default
-        elif gname.__class__ is str:
-            gobj: logging.Logger = getattr(gpack, gname, None)
-            if gobj.__class__ is not logging.Logger:
-                raise NameError(
-                    f"gname '{gname}' not found in '{__package__}'."
+        with self.lock:
+            if self.thread is None:
+                if self.queue is None:
+                    import queue
+                    self.queue = queue.SimpleQueue()
+                self.thread = threading.Thread(
+                    target=self.run, name=self.__class__.__name__, daemon=True
                 )
-        elif gname.__class__ is logging.Logger:
-            gobj: logging.Logger = gname
+                self.thread.start()
+                atexit.register(self.stop)
+        self.queue.put((partial, dest, codec, compresslevel, shift))
+
+    def run(self) -> None:
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            try:
+                self.compress(*job)
+            except Exception:
+                if logging.raiseExceptions:
+                    traceback.print_exc()
+
+    @staticmethod
+    def compress(
+            partial:       str,
+            dest:          str,
+            codec:         str,
+            compresslevel: Optional[int],
+            shift:         Optional[Callable[[], None]]
+    ) -> None:
+        if codec == "gzip":
+            import gzip
+            kw = {} if compresslevel is None else \
+                {"compresslevel": compresslevel}
+            opener = gzip.open
+        elif codec == "bz2":
+            import bz2
+            kw = {} if compresslevel is None else \
+                {"compresslevel": compresslevel}
+            opener = bz2.open
         else:
-            raise TypeError(
-                "parameter 'gname' type must be 'str' or 'logging.Logger', "
-                f"not '{gname.__class__.__name__}'."
-            )
+            import lzma
+            kw = {} if compresslevel is None else {"preset": compresslevel}
+            opener = lzma.open
 
-        if sys.version_info >= (3, 8):
-            if "stacklevel" not in kw:
-                kw["stacklevel"] = 2
-            elif kw["stacklevel"] < 2:
-                kw["stacklevel"] = 2
+        temp: str = partial + compress_suffixes[codec]
+        with open(partial, "rb") as src, opener(temp, "wb", **kw) as dst:
+            while True:
+                chunk: bytes = src.read(1 << 20)
+                if not chunk:
+                    break
+                dst.write(chunk)
+
+        if shift is not None:
+            shift()
+        os.replace(temp, dest)
+        os.remove(partial)
+
+    def stop(self) -> None:
+        with self.lock:
+            if self.thread is None:
+                return
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+            atexit.unregister(self.stop)
+
+
+compress_suffixes: Final[Dict[str, str]] = {
+    "gzip": ".gz",
+    "bz2":  ".bz2",
+    "xz":   ".xz"
+}
 
-        msg: str = sep.join(str(m) for m in msg)
+partial_numbers: Final[Iterator[int]] = itertools.count()
 
-        if oneline:
-            msg: str = linesep.join(
-                m.strip() for m in msg.split("\n") if m and not m.isspace()
+compressor = Compressor()
+
+
+def attach_handler(
+        attached:     List[logging.Handler],
+        async_groups: Dict[Tuple[int, str], List[logging.Handler]],
+        handler:      logging.Handler,
+        options:      Options
+) -> None:
+    tail_buffer: Optional[int] = options.get("tailBuffer")
+
+    if tail_buffer:
+        if options.get("async"):
+            # Records are buffered in the context of the caller, so the
+            # queue is behind the tail buffer, dedicated to this handler.
+            async_groups: Dict[Tuple[int, str], List[logging.Handler]] = {}
+            add_async_handler(async_groups, handler, options)
+            (queue_size, overflow), _ = async_groups.popitem()
+            handler = start_queue_listener(
+                [handler], queue_size, overflow, respect_handler_level=False
             )
+        attached.append(TailBufferHandler(
+            handler, tail_buffer, options.get("tailBufferTrigger", "ERROR")
+        ))
+    elif options.get("async"):
+        add_async_handler(async_groups, handler, options)
+    else:
+        attached.append(handler)
 
-        getattr(gobj, method)(msg, **kw)
 
-    return logger
+def add_async_handler(
+        async_groups: Dict[Tuple[int, str], List[logging.Handler]],
+        handler:      logging.Handler,
+        options:      Options
+) -> None:
+    queue_size: int = options.get("asyncQueueSize", 0)
+    overflow:   str = options.get("asyncOverflow", "block")
+
+    if overflow not in queue_overflow_policies:
+        raise ValueError(
+            f"option 'asyncOverflow' must be one of "
+            f"{queue_overflow_policies}, not {overflow!r}."
+        )
+
+    async_groups.setdefault((queue_size, overflow), []).append(handler)
+
+
+def start_queue_listener(
+        handlers:   List[logging.Handler],
+        queue_size: int,
+        overflow:   str,
+        *,
+        respect_handler_level: bool = True
+) -> "AsyncQueueHandler":
+    import queue
+
+    if queue_size > 0:
+        the_queue = queue.Queue(queue_size)
+    else:
+        the_queue = queue.SimpleQueue()
+
+    listener = QueueListener(
+        the_queue, *handlers, respect_handler_level=respect_handler_level
+    )
+    listener.start()
+
+    if not queue_listeners:
+        atexit.register(stop_queue_listeners)
+    queue_listeners.append(listener)
+
+    handler = AsyncQueueHandler(the_queue, overflow)
+    handler.setLevel(min(x.level for x in handlers))
+    handler.listener = listener
+
+    return handler
+
+
+def stop_queue_listeners() -> None:
+    # Registered to `atexit` after `logging.shutdown`, so it runs first: the
+    # queues are drained before `logging` flushes and closes the handlers.
+    while queue_listeners:
+        queue_listeners.pop().stop()
+
+
+queue_overflow_policies: Final[Tuple[str, ...]] = \
+    "block", "dropNewest", "dropOldest"
+
+queue_listeners: Final[List["QueueListener"]] = []
+
+
+# Like `logging.handlers.QueueHandler`, which is not imported for it.
+class AsyncQueueHandler(logging.Handler):
+
+    def __init__(self, the_queue: "queue.Queue", overflow: str):
+        super().__init__()
+        self.queue    = the_queue
+        self.overflow = overflow
+        self.dropped  = 0
+        self.listener: Optional[QueueListener] = None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.enqueue(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener lives in this process, the record does not need to be
+        # picklable. Only the message is rendered here, since its arguments
+        # may be changed by the caller afterwards, formatting is left to the
+        # listener thread.
+        record.msg  = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        # Called with the handler lock held, see `logging.Handler.handle`.
+        listener: QueueListener = self.listener
+        if self.overflow == "block":
+            self.queue.put(record)
+        elif self.overflow == "dropNewest":
+            import queue
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self.dropped += 1
+                return
+        else:
+            import queue
+            while True:
+                try:
+                    self.queue.put_nowait(record)
+                    break
+                except queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                        self.dropped += 1
+                        listener.evicted += 1
+                    except queue.Empty:
+                        pass
+        listener.enqueued += 1
+
+    def flush(self) -> None:
+        # The queued records are written first.
+        self.listener.join()
+        for handler in self.listener.handlers:
+            handler.flush()
+
+
+# Records below the level of `target` are kept in a ring buffer of `capacity`
+# records per thread and per asyncio task, without being formatted. When a
+# record at or above `trigger_level` arrives, the buffer of the thread or task
+# is written through `target` before the record. The buffer is kept in a
+# context variable with its owner: a task created after it was set inherits
+# it, and starts a buffer of its own.
+class TailBufferHandler(logging.Handler):
+
+    def __init__(
+            self,
+            target:        logging.Handler,
+            capacity:      int,
+            trigger_level: Level = logging.ERROR
+    ):
+        super().__init__()
+        self.target   = target
+        self.capacity = capacity
+        self.trigger_level: int = logging._checkLevel(trigger_level)
+
+        import contextvars
+        self.buffers = contextvars.ContextVar(f"tail-buffer-{id(self)}")
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.target.level:
+            owner: object = current_owner()
+            tail: Optional[Tuple[object, Deque[logging.LogRecord]]] = \
+                self.buffers.get(None)
+            if tail is None or tail[0] is not owner:
+                tail = owner, collections.deque(maxlen=self.capacity)
+                self.buffers.set(tail)
+            tail[1].append(record)
+            return False
+
+        if record.levelno >= self.trigger_level:
+            tail: Optional[Tuple[object, Deque[logging.LogRecord]]] = \
+                self.buffers.get(None)
+            if tail is not None and tail[0] is current_owner():
+                buffer: Deque[logging.LogRecord] = tail[1]
+                while buffer:
+                    self.target.handle(buffer.popleft())
+
+        return self.target.handle(record)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.target.handle(record)
+
+    def flush(self) -> None:
+        self.target.flush()
+
+    def close(self) -> None:
+        self.target.close()
+        super().close()
+
+
+def current_owner() -> object:
+    # The running asyncio task, else the current thread. `asyncio` is not
+    # imported for it, no task runs without it.
+    asyncio: Optional[ModuleType] = sys.modules.get("asyncio")
+    if asyncio is not None:
+        try:
+            task: Optional[object] = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is not None:
+            return task
+    return threading.current_thread()
+
+
+# Like `logging.handlers.QueueListener`, which is not imported for it. The
+# sentinel is put blocking, `put_nowait` fails on a full bounded queue.
+class QueueListener:
+
+    def __init__(
+            self,
+            the_queue: "queue.Queue",
+            *handlers: logging.Handler,
+            respect_handler_level: bool = False
+    ):
+        self.queue    = the_queue
+        self.handlers = handlers
+        self.respect_handler_level = respect_handler_level
+        self.thread: Optional[threading.Thread] = None
+
+        # Records put by the queue handler (with its lock held), taken back by
+        # it (option "asyncOverflow" "dropOldest"), and handled, see `join`.
+        self.enqueued = 0
+        self.evicted  = 0
+        self.handled  = 0
+        self.condition = threading.Condition()
+
+    def start(self) -> None:
+        self.thread = threading.Thread(
+            target=self.run, name=self.__class__.__name__, daemon=True
+        )
+        self.thread.start()
+
+    def run(self) -> None:
+        task_done: Optional[Callable[[], None]] = \
+            getattr(self.queue, "task_done", None)
+        try:
+            while True:
+                record: Optional[logging.LogRecord] = self.queue.get()
+                if record is not None:
+                    try:
+                        self.handle(record)
+                    except Exception:
+                        # A failing filter or handler loses this record only.
+                        if logging.raiseExceptions:
+                            traceback.print_exc()
+                    with self.condition:
+                        self.handled += 1
+                        self.condition.notify_all()
+                if task_done is not None:
+                    task_done()
+                if record is None:
+                    return
+        finally:
+            # Waiting in `join` is over, also if the thread died.
+            with self.condition:
+                self.condition.notify_all()
+
+    def handle(self, record: logging.LogRecord) -> None:
+        for handler in self.handlers:
+            if not self.respect_handler_level or \
+                    record.levelno >= handler.level:
+                handler.handle(record)
+
+    def join(self) -> None:
+        # Wait until the records put so far are handled. The queue is consumed
+        # in order, by the listener or by eviction, so they are once as many
+        # records were consumed.
+        target: int = self.enqueued
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.handled + self.evicted >= target or
+                self.thread is None or not self.thread.is_alive()
+            )
+
+    def stop(self) -> None:
+        if self.thread is not None:
+            if self.thread.is_alive():
+                self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+            with self.condition:
+                self.condition.notify_all()
+
+
+def set_format_outside_lock(handler: logging.Handler, options: Options) -> None:
+    # Option `formatOutsideLock`: the record is formatted by the calling thread
+    # before the handler lock is taken. Under the lock, `format` returns that
+    # text, so `emit` (with the rollover checks of rotating handlers) only
+    # writes, and threads logging to the same handler are only serialized for
+    # that. Lines are written whole as before.
+    if not options.get("formatOutsideLock"):
+        return
+
+    the_format: Callable[[logging.LogRecord], str] = handler.format
+    # The record being emitted and its text, only set with the lock held.
+    formatted: list = [None, None]
+
+    def handle(record: logging.LogRecord) -> Any:
+        result = handler.filter(record)
+        if result is not True and isinstance(result, logging.LogRecord):
+            record = result
+        if result:
+            try:
+                text: Optional[str] = the_format(record)
+            except Exception:
+                # Formatted again by `emit`, which reports the error.
+                text = None
+            with handler.lock:
+                formatted[:] = record, text
+                try:
+                    handler.emit(record)
+                finally:
+                    formatted[:] = None, None
+        return result
+
+    def format(record: logging.LogRecord) -> str:
+        if formatted[0] is record and formatted[1] is not None:
+            return formatted[1]
+        return the_format(record)
+
+    install(handler, "handle", handle)
+    install(handler, "format", format)
+
+
+# Formatted records are encoded into a buffer and written in large chunks. The
+# buffer is written when it reaches `buffer_bytes`, every `flush_interval`
+# seconds, when a record at or above `flush_level` arrives, and when the handler
+# is flushed or closed.
+class BufferedFileHandler(logging.FileHandler):
+
+    def __init__(
+            self,
+            filename:       str,
+            mode:           str           = "a",
+            encoding:       Optional[str] = None,
+            delay:          bool          = False,
+            errors:         Optional[str] = None,
+            buffer_bytes:   int           = 1 << 16,
+            flush_interval: float         = 1,
+            flush_level:    Level         = logging.ERROR
+    ):
+        self.buffer = bytearray()
+        self.buffer_bytes = buffer_bytes
+        self.flush_level: int = logging._checkLevel(flush_level)
+
+        # Parameter `errors` of `FileHandler` is new in Python 3.9, the file
+        # is opened in binary mode anyway.
+        super().__init__(filename, mode, encoding, delay)
+        self.errors = errors
+
+        if self.encoding is None or self.encoding == "locale":
+            import locale
+            self.encoding = locale.getpreferredencoding(False)
+
+        self.flush_interval = flush_interval
+        self.flusher_stopped = threading.Event()
+
+        if flush_interval:
+            self.flusher = threading.Thread(
+                target=self.flush_periodically,
+                name=f"{self.__class__.__name__}({self.baseFilename})",
+                daemon=True
+            )
+            self.flusher.start()
+        else:
+            self.flusher = None
+
+    def _open(self):
+        mode: str = self.mode if "b" in self.mode else self.mode + "b"
+        return open(self.baseFilename, mode)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.buffer += record_bytes(
+                self, record, self.encoding, self.errors or "strict"
+            )
+            if len(self.buffer) >= self.buffer_bytes or \
+                    record.levelno >= self.flush_level:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def flush(self) -> None:
+        with self.lock:
+            if not self.buffer:
+                return
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.buffer)
+            self.stream.flush()
+            self.buffer.clear()
+
+    def flush_periodically(self) -> None:
+        while not self.flusher_stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        self.flusher_stopped.set()
+        if self.flusher is not None and \
+                self.flusher is not threading.current_thread():
+            self.flusher.join()
+        with self.lock:
+            self.flush()
+            super().close()
+
+
+# Encoded records are copied into a memory-mapped segment of the file. The file
+# grows by `segment_bytes` at a time and is truncated to the length of the
+# data when closed. The unused part of a segment is zero bytes and records
+# never contain one (NUL characters are escaped), so after the process was
+# killed, the data ends before the first zero byte; an incomplete last record
+# is dropped when the file is opened again.
+class MmapFileHandler(logging.FileHandler):
+
+    def __init__(
+            self,
+            filename:      str,
+            mode:          str           = "a",
+            encoding:      Optional[str] = "UTF-8",
+            delay:         bool          = False,
+            errors:        Optional[str] = None,
+            segment_bytes: int           = 1 << 24
+    ):
+        import mmap
+        granularity: int = mmap.ALLOCATIONGRANULARITY
+        self.segment_bytes: int = \
+            max(1, -(-segment_bytes // granularity)) * granularity
+        super().__init__(filename, mode, encoding or "UTF-8", delay)
+        self.errors = errors
+
+    def _open(self) -> "MmapAppender":
+        return MmapAppender(
+            self.baseFilename, "w" in self.mode, self.segment_bytes
+        )
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            data: bytes = record_bytes(
+                self, record, self.encoding, self.errors or "strict"
+            )
+            if b"\0" in data:
+                data = data.replace(b"\0", b"\\0")
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(data)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+class MmapAppender:
+
+    def __init__(self, filename: str, truncate: bool, segment_bytes: int):
+        flags: int = os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0)
+        if truncate:
+            flags |= os.O_TRUNC
+        self.fd: int = os.open(filename, flags, 0o644)
+        self.segment_bytes = segment_bytes
+        self.mm: Optional["mmap.mmap"] = None
+        self.map_segment(self.find_end())
+
+    def find_end(self) -> int:
+        size: int = os.fstat(self.fd).st_size
+        if size == 0:
+            return 0
+        import mmap
+        with mmap.mmap(self.fd, size, access=mmap.ACCESS_READ) as mm:
+            end: int = mm.find(b"\0")
+            if end == -1:
+                return size
+            # Drop the record being written when the process was killed.
+            return mm.rfind(b"\n", 0, end) + 1
+
+    def map_segment(self, position: int) -> None:
+        import mmap
+        base: int = position - position % mmap.ALLOCATIONGRANULARITY
+        if os.fstat(self.fd).st_size < base + self.segment_bytes:
+            os.ftruncate(self.fd, base + self.segment_bytes)
+        self.mm = mmap.mmap(self.fd, self.segment_bytes, offset=base)
+        self.base     = base
+        self.position = position - base
+
+    def write(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            room: int = self.segment_bytes - self.position
+            if room == 0:
+                self.mm.close()
+                self.map_segment(self.base + self.segment_bytes)
+                continue
+            n: int = min(room, len(view))
+            self.mm[self.position:self.position + n] = view[:n]
+            self.position += n
+            view = view[n:]
+
+    def flush(self) -> None:
+        # The mapped pages belong to the page cache, they survive the process.
+        pass
+
+    def close(self) -> None:
+        if self.mm is None:
+            return
+        end: int = self.base + self.position
+        self.mm.flush()
+        self.mm.close()
+        self.mm = None
+        os.ftruncate(self.fd, end)
+        os.close(self.fd)
+
+
+# Records are written as length-prefixed binary frames, never formatted: the
+# formatter of the handler is not used. Logger names, paths, function names,
+# templates and the like are written once per file (a STRING frame) and then
+# referred to by id, as are call sites (a SITE frame). A RECORD frame holds the
+# raw timestamp, the level, the call site, and the message as passed to the
+# logging method: the arguments of the logging methods of this module, or a
+# template and its arguments. Other objects than `str`, `int`, `float`, `bool`
+# and None are converted with `str`. Use `read_binary_log` or
+#
+#     python -m gqylpy_log.decode
+#
+# to read the file.
+class BinaryFileHandler(logging.FileHandler):
+    max_strings = 1 << 16
+
+    def __init__(
+            self,
+            filename: str,
+            mode:     str  = "a",
+            delay:    bool = False
+    ):
+        load_structs()
+        self.strings: Dict[str, int]   = {}
+        self.sites:   Dict[tuple, int] = {}
+        if "b" not in mode:
+            mode += "b"
+        super().__init__(filename, mode, None, delay)
+
+    def _open(self) -> BinaryIO:
+        stream: BinaryIO = super()._open()
+        # Every file starts with its own tables.
+        self.strings.clear()
+        self.sites.clear()
+        if stream.seek(0, io.SEEK_END) == 0:
+            stream.write(binary_magic)
+        else:
+            with open(self.baseFilename, "rb") as file:
+                magic: bytes = file.read(len(binary_magic))
+            if magic != binary_magic:
+                stream.close()
+                raise ValueError(
+                    f"cannot append to '{self.baseFilename}', it is not a "
+                    f"binary log of this version ({magic!r})."
+                )
+        return stream
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            out = bytearray()
+            try:
+                self.encode_record(record, out)
+                self.stream.write(out)
+                self.stream.flush()
+            except BaseException:
+                # What was interned may not be in the file, define it again.
+                self.strings.clear()
+                self.sites.clear()
+                raise
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def string_id(self, value: str, out: bytearray) -> int:
+        try:
+            return self.strings[value]
+        except KeyError:
+            pass
+        sid: int = len(self.strings) + 1
+        self.strings[value] = sid
+        data: bytes = value.encode("UTF-8", "surrogatepass")
+        out += frame_header.pack(FRAME_STRING, 4 + len(data))
+        out += uint32.pack(sid)
+        out += data
+        return sid
+
+    def encode_record(self, record: logging.LogRecord, out: bytearray) -> None:
+        key = record.name, record.pathname, record.lineno, record.funcName
+        site: Optional[int] = self.sites.get(key)
+        if site is None:
+            site_frame: bytes = site_struct.pack(
+                len(self.sites) + 1,
+                self.string_id(record.name, out),
+                self.string_id(record.pathname, out),
+                self.string_id(record.funcName or "", out),
+                record.lineno
+            )
+            site = self.sites[key] = len(self.sites) + 1
+            out += frame_header.pack(FRAME_SITE, len(site_frame))
+            out += site_frame
+
+        body = bytearray(record_struct.pack(
+            record.created, record.levelno, site, record.process or 0,
+            self.string_id(record.threadName or "", out)
+        ))
+
+        msg, args = record.msg, record.args
+        if msg.__class__ is LazyMessage:
+            body += b"L"
+            body += lazy_struct.pack(
+                self.string_id(msg.sep, out), bool(msg.oneline),
+                self.string_id(msg.linesep, out), msg.max_length, len(msg.msg)
+            )
+            for value in msg.msg:
+                encode_value(value, body)
+        elif args and args.__class__ is tuple and msg.__class__ is str and \
+                all(x.__class__ in raw_value_types for x in args):
+            # Other arguments would not give the same text once converted,
+            # think of "%r".
+            if msg in self.strings or len(self.strings) < self.max_strings:
+                body += b"P"
+                body += uint32.pack(self.string_id(msg, out))
+            else:
+                # Not likely a template, the table is kept bounded.
+                body += b"p"
+                encode_value(msg, body)
+            body += uint32.pack(len(args))
+            for value in args:
+                encode_value(value, body)
+        else:
+            body += b"S"
+            encode_value(record.getMessage(), body)
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = \
+                logging._defaultFormatter.formatException(record.exc_info)
+        encode_value(record.exc_text, body)
+        encode_value(record.stack_info, body)
+
+        out += frame_header.pack(FRAME_RECORD, len(body))
+        out += body
+
+
+def encode_value(value: Any, out: bytearray) -> None:
+    if value.__class__ is str:
+        data: bytes = value.encode("UTF-8", "surrogatepass")
+        out += b"s"
+        out += uint32.pack(len(data))
+        out += data
+    elif value.__class__ is int:
+        if -1 << 63 <= value < 1 << 63:
+            out += b"i"
+            out += int64.pack(value)
+        else:
+            data: bytes = str(value).encode()
+            out += b"I"
+            out += uint32.pack(len(data))
+            out += data
+    elif value.__class__ is float:
+        out += b"f"
+        out += float64.pack(value)
+    elif value is None:
+        out += b"n"
+    elif value is True:
+        out += b"t"
+    elif value is False:
+        out += b"F"
+    else:
+        encode_value(str(value), out)
+
+
+def decode_value(data: bytes, offset: int) -> Tuple[Any, int]:
+    tag: int = data[offset]
+    offset += 1
+    if tag == 115:  # s
+        size: int = uint32.unpack_from(data, offset)[0]
+        offset += 4
+        return data[offset:offset + size].decode("UTF-8", "surrogatepass"), \
+            offset + size
+    if tag == 105:  # i
+        return int64.unpack_from(data, offset)[0], offset + 8
+    if tag == 73:   # I
+        size: int = uint32.unpack_from(data, offset)[0]
+        offset += 4
+        return int(data[offset:offset + size]), offset + size
+    if tag == 102:  # f
+        return float64.unpack_from(data, offset)[0], offset + 8
+    if tag == 110:  # n
+        return None, offset
+    if tag == 116:  # t
+        return True, offset
+    if tag == 70:   # F
+        return False, offset
+    raise ValueError(f"unknown value tag {tag!r} in binary log.")
+
+
+def read_binary_log(file: BinaryIO) -> Iterator[logging.LogRecord]:
+    # Yields the records of a file written by `BinaryFileHandler`. A last
+    # frame that was not completely written is ignored.
+    load_structs()
+    record_struct: struct.Struct = \
+        record_structs.get(file.read(len(binary_magic)))
+    if record_struct is None:
+        raise ValueError("not a binary log written by BinaryFileHandler.")
+
+    strings: Dict[int, str]   = {0: ""}
+    sites:   Dict[int, tuple] = {}
+    header_size: int = frame_header.size
+
+    while True:
+        header: bytes = file.read(header_size)
+        if len(header) < header_size:
+            return
+        kind, size = frame_header.unpack(header)
+        data: bytes = file.read(size)
+        if len(data) < size:
+            return
+
+        if kind == FRAME_STRING:
+            strings[uint32.unpack_from(data)[0]] = \
+                data[4:].decode("UTF-8", "surrogatepass")
+            continue
+        if kind == FRAME_SITE:
+            site, name, pathname, func_name, lineno = site_struct.unpack(data)
+            sites[site] = (
+                strings[name], strings[pathname], lineno, strings[func_name]
+            )
+            continue
+        if kind != FRAME_RECORD:
+            continue
+
+        created, levelno, site, process, thread_name = \
+            record_struct.unpack_from(data)
+        offset: int = record_struct.size
+        kind: int = data[offset]
+        offset += 1
+
+        args: tuple = ()
+        if kind == 76:  # L
+            sep, oneline, linesep, max_length, count = \
+                lazy_struct.unpack_from(data, offset)
+            offset += lazy_struct.size
+            parts: List[Any] = []
+            for _ in range(count):
+                value, offset = decode_value(data, offset)
+                parts.append(value)
+            msg: Any = LazyMessage(
+                tuple(parts), strings[sep], bool(oneline), strings[linesep],
+                max_length
+            )
+        elif kind in (80, 112):  # P, p
+            if kind == 80:
+                msg = strings[uint32.unpack_from(data, offset)[0]]
+                offset += 4
+            else:
+                msg, offset = decode_value(data, offset)
+            count: int = uint32.unpack_from(data, offset)[0]
+            offset += 4
+            values: List[Any] = []
+            for _ in range(count):
+                value, offset = decode_value(data, offset)
+                values.append(value)
+            args = tuple(values)
+        else:
+            msg, offset = decode_value(data, offset)
+
+        exc_text,   offset = decode_value(data, offset)
+        stack_info, offset = decode_value(data, offset)
+
+        name, pathname, lineno, func_name = sites[site]
+        record = logging.LogRecord(
+            name, levelno, pathname, lineno, msg, args, None,
+            func_name or None, stack_info
+        )
+        record.created    = created
+        record.msecs      = int((created - int(created)) * 1000) + .0
+        record.process    = process
+        record.threadName = strings[thread_name]
+        record.exc_text   = exc_text
+        yield record
+
+
+FRAME_STRING: Final = 1
+FRAME_SITE:   Final = 2
+FRAME_RECORD: Final = 3
+
+# Version 2 widened the level to a signed 32-bit integer.
+binary_magic: Final[bytes] = b"GLOGBIN2"
+
+raw_value_types: Final[frozenset] = frozenset({
+    str, int, float, bool, type(None)
+})
+
+# Built by `load_structs`.
+frame_header:  "struct.Struct"
+site_struct:   "struct.Struct"
+record_struct: "struct.Struct"
+# The record struct of each version, by magic.
+record_structs: "Dict[bytes, struct.Struct]"
+lazy_struct:   "struct.Struct"
+uint32:        "struct.Struct"
+int64:         "struct.Struct"
+float64:       "struct.Struct"
+
+
+def load_structs() -> None:
+    # `struct` is imported by the first binary log handler or reader.
+    global frame_header, site_struct, record_struct, record_structs, \
+        lazy_struct, uint32, int64, float64
+    if "float64" in gcode.__dict__:
+        return
+    import struct
+    frame_header  = struct.Struct("<BI")
+    site_struct   = struct.Struct("<IIIII")
+    record_struct = struct.Struct("<diIII")
+    record_structs = {
+        b"GLOGBIN1": struct.Struct("<dBIII"),
+        binary_magic: record_struct
+    }
+    lazy_struct   = struct.Struct("<I?III")
+    uint32        = struct.Struct("<I")
+    int64         = struct.Struct("<q")
+    float64       = struct.Struct("<d")
+
+
+handler_types: Final[Dict[str, Type[logging.Handler]]] = {
+    "Handler":             logging.Handler,
+    "StreamHandler":       logging.StreamHandler,
+    "FileHandler":         logging.FileHandler,
+    "NullHandler":         logging.NullHandler,
+    "BufferedFileHandler": BufferedFileHandler,
+    "MmapFileHandler":     MmapFileHandler,
+    "BinaryFileHandler":   BinaryFileHandler
+}
+
+
+# Sends records to the collector process at `address`, which is started when
+# no process is listening. The collector creates the configured handlers, and
+# is the only process writing the log files. Records are sent as JSON, never
+# pickled.
+class CollectorHandler(logging.Handler):
+    spawn_timeout = 5
+
+    def __init__(
+            self,
+            name:      str,
+            level:     Level,
+            formatter: Formatter,
+            options:   Options,
+            handlers:  List[Handler]
+    ):
+        import json
+        super().__init__()
+        self.dumps: Callable[..., str] = json.dumps
+
+        address: Union[str, list] = options["collector"]
+        self.address: Union[str, tuple] = \
+            address if isinstance(address, str) else tuple(address)
+
+        authkey: Optional[str] = options.get("collectorAuthkey")
+        self.authkey: Optional[bytes] = \
+            authkey.encode() if authkey is not None else None
+
+        config: Dict[str, Any] = {
+            "level":    level,
+            "options":  {
+                k: v for k, v in options.items()
+                if k not in collector_local_options and
+                not k.startswith("collector")
+            },
+            "handlers": handlers
+        }
+        if isinstance(formatter, dict):
+            config["formatter"] = formatter
+        elif formatter.__class__ is not logging.Formatter or \
+                formatter._fmt != logging.PercentStyle.default_format or \
+                formatter.datefmt is not None:
+            raise TypeError(
+                "in collector mode, parameter 'formatter' must be a dict."
+            )
+
+        # Serialized now, so that unsupported values (such as callable
+        # filters in handlers) fail here rather than in the collector.
+        self.spawn_params: bytes = self.dumps({
+            "address": address,
+            "authkey": authkey,
+            "linger":  options.get("collectorLinger", 10),
+            "name":    name,
+            "config":  config
+        }).encode()
+
+        self.conn: Optional["multiprocessing_connection.Connection"] = None
+        self.pid:  Optional[int] = None
+        self.retry_time: float = 0
+        # Records lost while the collector was unreachable, reported to it
+        # once connected again.
+        self.dropped = 0
+
+    def connect(self) -> None:
+        from multiprocessing import connection as multiprocessing_connection
+        try:
+            conn = multiprocessing_connection.Client(
+                self.address, authkey=self.authkey
+            )
+        except OSError:
+            self.spawn_collector()
+            deadline: float = time.monotonic() + self.spawn_timeout
+            while True:
+                time.sleep(.05)
+                try:
+                    conn = multiprocessing_connection.Client(
+                        self.address, authkey=self.authkey
+                    )
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise
+        self.conn, self.pid = conn, os.getpid()
+
+    def spawn_collector(self) -> None:
+        import subprocess
+        env: Dict[str, str] = os.environ.copy()
+        pythonpath: List[str] = [os.path.dirname(os.path.dirname(__file__))]
+        if env.get("PYTHONPATH"):
+            pythonpath.append(env["PYTHONPATH"])
+        env["PYTHONPATH"] = os.pathsep.join(pythonpath)
+
+        code = f"import sys, {__package__}; " \
+               f"sys.modules[{__name__!r}].serve_collector()"
+
+        kw: Dict[str, Any] = {}
+        if os.name == "posix":
+            # Detached, the collector may outlive the process spawning it.
+            kw["start_new_session"] = True
+
+        process = subprocess.Popen(
+            [sys.executable, "-c", code],
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, env=env, **kw
+        )
+        process.stdin.write(self.spawn_params)
+        process.stdin.close()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            data: bytes = self.serialize(record)
+            # A forked process must not share the connection of its parent.
+            if self.conn is None or self.pid != os.getpid():
+                if time.monotonic() < self.retry_time:
+                    self.dropped += 1
+                    return
+                self.connect()
+            try:
+                self.send_dropped(record)
+                self.conn.send_bytes(data)
+            except OSError:
+                # The collector is gone, reconnect (or respawn) once.
+                self.conn = None
+                self.connect()
+                self.send_dropped(record)
+                self.conn.send_bytes(data)
+        except RecursionError:
+            raise
+        except Exception:
+            self.conn = None
+            self.retry_time = time.monotonic() + 1
+            self.dropped += 1
+            self.handleError(record)
+
+    def send_dropped(self, record: logging.LogRecord) -> None:
+        if not self.dropped:
+            return
+        summary = logging.LogRecord(
+            record.name, logging.WARNING, __file__, 0,
+            "%d records dropped, the collector %r was unreachable",
+            (self.dropped, self.address), None
+        )
+        self.conn.send_bytes(self.serialize(summary))
+        self.dropped = 0
+
+    def serialize(self, record: logging.LogRecord) -> bytes:
+        # The same preparation as `logging.handlers.SocketHandler.makePickle`.
+        values: Dict[str, Any] = dict(record.__dict__)
+        if record.exc_info and not record.exc_text:
+            values["exc_text"] = \
+                logging._defaultFormatter.formatException(record.exc_info)
+        values["msg"]      = record.getMessage()
+        values["args"]     = None
+        values["exc_info"] = None
+        values.pop("message", None)
+        return self.dumps(values, default=str).encode()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.conn is not None and self.pid == os.getpid():
+                self.conn.close()
+            self.conn = None
+            super().close()
+
+
+def serve_collector() -> None:
+    import json
+    from multiprocessing import connection as multiprocessing_connection
+
+    params: Dict[str, Any] = json.load(sys.stdin)
+
+    address: Union[str, tuple] = params["address"]
+    if not isinstance(address, str):
+        address = tuple(address)
+    authkey: Optional[str] = params["authkey"]
+    linger:  float         = params["linger"]
+
+    family: str = multiprocessing_connection.address_type(address)
+    if family == "AF_UNIX":
+        # The lock is held for the lifetime of the collector, so a socket
+        # file left by a killed collector can be removed safely.
+        import fcntl
+        lockfile = open(address + ".lock", "a")
+        try:
+            fcntl.flock(lockfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return
+        if os.path.exists(address):
+            os.unlink(address)
+
+    try:
+        listener = multiprocessing_connection.Listener(
+            address,
+            backlog=128,
+            authkey=authkey.encode() if authkey is not None else None
+        )
+    except OSError:
+        # Another collector is listening.
+        return
+
+    logger: logging.Logger = __init__(params["name"], **params["config"])
+
+    clients = [0]
+    changed = threading.Condition()
+
+    def receive(conn: multiprocessing_connection.Connection) -> None:
+        try:
+            while True:
+                record = logging.makeLogRecord(json.loads(conn.recv_bytes()))
+                logger.handle(record)
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+            with changed:
+                clients[0] -= 1
+                changed.notify()
+
+    def accept() -> None:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception:
+                continue
+            with changed:
+                clients[0] += 1
+                changed.notify()
+            threading.Thread(target=receive, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+
+    # Exit once no process has been connected for `linger` seconds.
+    with changed:
+        while True:
+            if clients[0]:
+                changed.wait()
+            elif not changed.wait(linger) and not clients[0]:
+                break
+
+    # The handlers are flushed and closed by `logging.shutdown` at exit.
+    listener.close()
+
+
+def add_suppression_filter(
+        filterer: Union[logging.Logger, logging.Handler],
+        options:  Options
+) -> None:
+    sample:     Optional[float] = options.get("sample")
+    rate_limit: Optional[dict]  = options.get("rateLimit")
+    if sample is None and rate_limit is None:
+        return
+    x = SuppressionFilter(
+        filterer, sample, rate_limit, options.get("suppressedSummary", 60)
+    )
+    filterer.filters.append(x)
+
+
+# Filter of options `sample` and `rateLimit`, it runs before the message is
+# rendered. Records are sampled with probability `sample`, then limited by a
+# token bucket per call site (logger, level, file and line). At most every
+# `summary_interval` seconds, the next record is preceded by a record
+# reporting how many records were suppressed. The logging methods of this
+# module sample the calls to a logger before the record is created (see
+# `sample_call`), its filter does not sample these records again.
+class SuppressionFilter:
+    max_buckets = 10000
+
+    def __init__(
+            self,
+            filterer:         Union[logging.Logger, logging.Handler],
+            sample:           Optional[float],
+            rate_limit:       Optional[Dict[str, float]],
+            summary_interval: float
+    ):
+        self.filterer = weakref.proxy(filterer)
+        self.sample   = sample
+        self.on_logger: bool = isinstance(filterer, logging.Logger)
+        if sample is not None:
+            from random import random
+            self.random: Callable[[], float] = random
+        if rate_limit is None:
+            self.per_second = None
+        else:
+            self.per_second: float = rate_limit["per_second"]
+            self.burst:      float = rate_limit.get("burst", self.per_second)
+        self.summary_interval = summary_interval
+
+        self.buckets: Dict[tuple, List[float]] = {}
+        self.suppressed       = 0
+        self.suppressed_level = logging.NOTSET
+        self.next_summary     = time.monotonic() + summary_interval
+        self.lock = threading.Lock()
+
+    def __call__(self, record: logging.LogRecord) -> bool:
+        if record.__class__ is SuppressionSummary:
+            return True
+
+        now: float = time.monotonic()
+
+        if self.suppressed and self.summary_interval and \
+                now >= self.next_summary:
+            self.report(record, now)
+
+        if self.sample is not None and not (
+                self.on_logger and getattr(presampled, "active", False)
+        ) and self.random() >= self.sample:
+            return self.suppress(record.levelno)
+
+        if self.per_second is not None:
+            key = record.name, record.levelno, record.pathname, record.lineno
+            with self.lock:
+                try:
+                    bucket: List[float] = self.buckets[key]
+                except KeyError:
+                    if len(self.buckets) >= self.max_buckets:
+                        self.buckets.clear()
+                    bucket = self.buckets[key] = [self.burst, now]
+                tokens: float = min(
+                    self.burst, bucket[0] + (now - bucket[1]) * self.per_second
+                )
+                bucket[1] = now
+                if tokens < 1:
+                    bucket[0] = tokens
+                else:
+                    bucket[0] = tokens - 1
+            if tokens < 1:
+                return self.suppress(record.levelno)
+
+        return True
+
+    def sample_call(self, levelno: int) -> bool:
+        # Whether a call of a logging method is kept, counted as suppressed
+        # otherwise. The record is then handled with `presampled.active` set.
+        if self.random() < self.sample:
+            return True
+        return self.suppress(levelno)
+
+    def suppress(self, levelno: int) -> bool:
+        with self.lock:
+            self.suppressed += 1
+            if levelno > self.suppressed_level:
+                self.suppressed_level = levelno
+        return False
+
+    def report(self, record: logging.LogRecord, now: float) -> None:
+        with self.lock:
+            if not self.suppressed or now < self.next_summary:
+                return
+            suppressed, self.suppressed = self.suppressed, 0
+            levelno, self.suppressed_level = \
+                self.suppressed_level, logging.NOTSET
+            self.next_summary = now + self.summary_interval
+        self.filterer.handle(SuppressionSummary(
+            record.name, levelno, record.pathname, record.lineno,
+            f"{suppressed} messages suppressed by sampling or rate limiting.",
+            None, None, record.funcName
+        ))
+
+
+class SuppressionSummary(logging.LogRecord):
+    pass
+
+
+# `active` is set while the thread handles a record already sampled by
+# `SuppressionFilter.sample_call`.
+presampled: Final[threading.local] = threading.local()
+
+
+# Filter of option `collapseDuplicates`. A record identical to the previous
+# one (same logger, level, call site and message) within `window` seconds of
+# the first of them is dropped. A record reporting how many times the message
+# was repeated is written before a different record, or by a timer when the
+# window is over, or at exit. Only the previous record is kept.
+class DuplicateFilter:
+
+    def __init__(self, handler: logging.Handler, window: float):
+        self.handler = weakref.proxy(handler)
+        self.window  = window
+
+        self.last_key: Optional[tuple] = None
+        self.last_record: Optional[logging.LogRecord] = None
+        self.window_end = 0.
+        self.repeated   = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, record: logging.LogRecord) -> bool:
+        if record.__class__ is DuplicateSummary:
+            return True
+
+        key = (
+            record.name, record.levelno, record.pathname, record.lineno,
+            record.getMessage()
+        )
+
+        with self.lock:
+            if key == self.last_key and record.created < self.window_end:
+                self.repeated += 1
+                if self.repeated == 1:
+                    timer = threading.Timer(
+                        self.window_end - time.time(), self.summarize
+                    )
+                    timer.daemon = True
+                    timer.start()
+                    pending_duplicates.add(self)
+                return False
+            repeated,    self.repeated    = self.repeated, 0
+            last_record, self.last_record = self.last_record, record
+            self.last_key   = key
+            self.window_end = record.created + self.window
+
+        if repeated:
+            self.handler.handle(self.summary(last_record, repeated))
+
+        return True
+
+    def summarize(self) -> None:
+        # The repetitions counted so far, written without waiting for a
+        # different record.
+        with self.lock:
+            repeated, self.repeated = self.repeated, 0
+            last_record: Optional[logging.LogRecord] = self.last_record
+        if repeated:
+            try:
+                self.handler.handle(self.summary(last_record, repeated))
+            except ReferenceError:
+                # The handler is gone.
+                pass
+
+    @staticmethod
+    def summary(
+            last_record: logging.LogRecord,
+            repeated:    int
+    ) -> "DuplicateSummary":
+        return DuplicateSummary(
+            last_record.name, last_record.levelno, last_record.pathname,
+            last_record.lineno, f"last message repeated {repeated} times.",
+            None, None, last_record.funcName
+        )
+
+
+class DuplicateSummary(logging.LogRecord):
+    pass
+
+
+def summarize_duplicates() -> None:
+    # Registered to `atexit` after `logging.shutdown`, so it runs first.
+    for x in list(pending_duplicates):
+        x.summarize()
+
+
+pending_duplicates: Final["weakref.WeakSet[DuplicateFilter]"] = \
+    weakref.WeakSet()
+
+atexit.register(summarize_duplicates)
+
+
+def enable_stats(logger: logging.Logger, options: Options) -> None:
+    sample:   float = options.get("statsSample", .01)
+    interval: float = options.get("statsInterval", 0)
+
+    previous: Optional[LoggerStats] = stats_registry.get(logger.name)
+    if previous is not None:
+        previous.stopped.set()
+
+    logger_stats = stats_registry[logger.name] = LoggerStats(
+        logger, max(1, round(1 / sample)) if sample > 0 else 0
+    )
+    if interval > 0:
+        threading.Thread(
+            target=logger_stats.report,
+            args=(interval,),
+            name=f"{LoggerStats.__name__}-{logger.name}",
+            daemon=True
+        ).start()
+
+
+# Counters of option `stats`, installed on the instances of the logger and its
+# handlers, nothing is installed without the option. The counters are updated
+# without locks, they may miss a few records under contention. Format and emit
+# times are measured on one record out of `timing_every` (0 for none).
+class LoggerStats:
+
+    def __init__(self, logger: logging.Logger, timing_every: int):
+        self.logger  = logger
+        self.emitted = collections.Counter()
+        self.dropped = collections.Counter()
+        self.stopped = threading.Event()
+
+        the_filter: Callable[[logging.LogRecord], Any] = logger.filter
+
+        def filter(record: logging.LogRecord) -> Any:
+            result = the_filter(record)
+            if result:
+                self.emitted[record.levelname] += 1
+            else:
+                self.dropped[record.levelname] += 1
+            return result
+
+        logger.filter = filter
+
+        # The wrappers created by `__init__` and the handlers behind them.
+        # The tail buffer holds records back, it does not drop them.
+        handlers: Dict[int, logging.Handler] = {
+            id(handler): handler
+            for handler in logger.handlers + inner_handlers(logger.handlers)
+            if handler.__class__ is not TailBufferHandler
+        }
+        self.handlers: List[HandlerStats] = [
+            HandlerStats(handler, timing_every)
+            for handler in handlers.values()
+        ]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "emitted":  dict(self.emitted),
+            "dropped":  dict(self.dropped),
+            "handlers": [x.snapshot() for x in self.handlers]
+        }
+
+    def report(self, interval: float) -> None:
+        while not self.stopped.wait(interval):
+            self.logger.info("stats %s", self.snapshot())
+
+
+class HandlerStats:
+
+    def __init__(self, handler: logging.Handler, timing_every: int):
+        self.handler = handler
+        self.emitted = collections.Counter()
+        self.dropped = collections.Counter()
+        self.bytes   = 0
+        self.errors  = 0
+        self.formatted      = 0
+        self.format_time    = 0
+        self.format_samples = 0
+        self.emits          = 0
+        self.emit_time      = 0
+        self.emit_samples   = 0
+
+        encoding: str = getattr(handler, "encoding", None) or "UTF-8"
+        terminator: int = len(getattr(handler, "terminator", ""))
+        timer: Callable[[], int] = time.perf_counter_ns
+
+        the_handle:       Callable = handler.handle
+        the_format:       Callable = handler.format
+        the_emit:         Callable = handler.emit
+        the_handle_error: Callable = handler.handleError
+
+        def handle(record: logging.LogRecord) -> Any:
+            result = the_handle(record)
+            if result:
+                self.emitted[record.levelname] += 1
+            else:
+                self.dropped[record.levelname] += 1
+            return result
+
+        def format(record: logging.LogRecord) -> str:
+            if timing_every and self.formatted % timing_every == 0:
+                start: int = timer()
+                message: str = the_format(record)
+                self.format_time += timer() - start
+                self.format_samples += 1
+            else:
+                message: str = the_format(record)
+            self.formatted += 1
+            self.bytes += terminator + (
+                len(message) if message.isascii() else
+                len(message.encode(encoding, "replace"))
+            )
+            return message
+
+        def emit(record: logging.LogRecord) -> None:
+            if timing_every and self.emits % timing_every == 0:
+                start: int = timer()
+                the_emit(record)
+                self.emit_time += timer() - start
+                self.emit_samples += 1
+            else:
+                the_emit(record)
+            self.emits += 1
+
+        def handle_error(record: logging.LogRecord) -> None:
+            self.errors += 1
+            the_handle_error(record)
+
+        install(handler, "handle", handle)
+        install(handler, "format", format)
+        install(handler, "emit", emit)
+        install(handler, "handleError", handle_error)
+
+    def snapshot(self) -> Dict[str, Any]:
+        snapshot: Dict[str, Any] = {
+            "handler":    self.handler.__class__.__name__,
+            "name":       self.handler.name,
+            "emitted":    dict(self.emitted),
+            "dropped":    dict(self.dropped),
+            "bytes":      self.bytes,
+            "errors":     self.errors,
+            # Seconds per record, emitting includes formatting.
+            "formatTime": self.format_time / self.format_samples / 1e9
+            if self.format_samples else None,
+            "emitTime":   self.emit_time / self.emit_samples / 1e9
+            if self.emit_samples else None
+        }
+        if self.handler.__class__ is AsyncQueueHandler:
+            snapshot["queueDepth"]   = self.handler.queue.qsize()
+            snapshot["queueDropped"] = self.handler.dropped
+        return snapshot
+
+
+stats_registry: Final[Dict[str, LoggerStats]] = {}
+
+
+collector_local_options: Final[Tuple[str, ...]] = (
+    "findCaller", "sample", "rateLimit", "suppressedSummary",
+    "stats", "statsSample", "statsInterval",
+    "oneline", "linesep", "maxMessageLength"
+)
+
+
+# Handler filter of option `onlyRecordCurrentLevel`, the level is kept so that
+# `will_record` can evaluate it without building a record.
+class OnlyRecordCurrentLevel:
+    __slots__ = "levelno",
+
+    def __init__(self, levelno: int):
+        self.levelno = levelno
+
+    def __call__(self, record: logging.LogRecord) -> bool:
+        return record.levelno == self.levelno
+
+
+# The filters of this module, which never change the records they pass.
+record_preserving_filters: Final[frozenset] = frozenset({
+    OnlyRecordCurrentLevel, DuplicateFilter, SuppressionFilter
+})
+
+# The log message is joined only when a handler formats the record, and only
+# once no matter how many handlers format it.
+class LazyMessage:
+    __slots__ = "msg", "sep", "oneline", "linesep", "max_length", "rendered"
+
+    def __init__(
+            self,
+            msg:        tuple,
+            sep:        str,
+            oneline:    bool,
+            linesep:    str,
+            max_length: int = 0
+    ):
+        self.msg        = msg
+        self.sep        = sep
+        self.oneline    = oneline
+        self.linesep    = linesep
+        self.max_length = max_length
+        self.rendered   = None
+
+    def __str__(self) -> str:
+        if self.rendered is None:
+            self.rendered = render_message(
+                self.msg, self.sep, self.oneline, self.linesep, self.max_length
+            )
+        return self.rendered
+
+    def __repr__(self) -> str:
+        return repr(self.__str__())
+
+
+def render_message(
+        msg:        tuple,
+        sep:        str,
+        oneline:    bool,
+        linesep:    str,
+        max_length: int
+) -> str:
+    if not oneline and not max_length:
+        return sep.join(str(m) for m in msg)
+
+    # The messages and separators are taken piece by piece, never joined
+    # before being normalized. With `oneline`, the text is stripped and every
+    # run of whitespace containing a line break ("\n", "\r\n" or "\r") becomes
+    # `linesep`. A run spanning several pieces is held in `space` until the
+    # next text. Pieces after `max_length` are not rendered at all.
+    pieces: List[str] = []
+    size:   int       = 0
+    space:  str       = ""
+
+    for i, m in enumerate(msg):
+        for chunk in (sep, m) if i else (m,):
+            if chunk.__class__ is not str:
+                chunk = str(chunk)
+            if oneline:
+                text: str = chunk.strip()
+                if not text:
+                    space += chunk
+                    continue
+                lead: int = leading_space.match(chunk).end()
+                if pieces:
+                    space += chunk[:lead]
+                    if "\n" in space or "\r" in space:
+                        space = linesep
+                    pieces.append(space)
+                    size += len(space)
+                space = chunk[lead + len(text):]
+                chunk = join_lines(
+                    text, linesep, max_length and max_length - size + 1
+                )
+            pieces.append(chunk)
+            size += len(chunk)
+            if max_length and size > max_length:
+                excess: int = size - max_length
+                while excess >= len(pieces[-1]):
+                    excess -= len(pieces.pop())
+                pieces[-1] = pieces[-1][:len(pieces[-1]) - excess]
+                pieces.append("...")
+                return "".join(pieces)
+
+    return "".join(pieces)
+
+
+def join_lines(text: str, linesep: str, limit: int = 0) -> str:
+    # `text` is stripped. Normalizing a prefix of it gives a prefix of the
+    # result, so with `limit`, prefixes twice as long are tried until one gives
+    # at least `limit` characters. Splitting and joining is faster than a
+    # regex substitution.
+    end: int = limit * 2 if limit else len(text)
+    while True:
+        part: str = text[:end].rstrip() if end < len(text) else text
+        if "\r" in part:
+            part = part.replace("\r\n", "\n").replace("\r", "\n")
+        if "\n" in part:
+            part = linesep.join(filter(None, map(str.strip, part.split("\n"))))
+        if end >= len(text) or len(part) >= limit:
+            return part
+        end *= 2
+
+
+leading_space: Final[re.Pattern] = re.compile(r"\s*")
+
+
+method_levels: Final[Dict[str, int]] = {
+    "debug":     logging.DEBUG,
+    "info":      logging.INFO,
+    "warning":   logging.WARNING,
+    "warn":      logging.WARNING,
+    "error":     logging.ERROR,
+    "exception": logging.ERROR,
+    "critical":  logging.CRITICAL,
+    "fatal":     logging.CRITICAL
+}
+
+
+def will_record(logger: logging.Logger, levelno: int) -> bool:
+    if not logging.Logger.isEnabledFor(logger, levelno):
+        return False
+
+    found_handler = False
+    while logger:
+        for handler in logger.handlers:
+            found_handler = True
+            if levelno < handler.level:
+                continue
+            for x in handler.filters:
+                if x.__class__ is OnlyRecordCurrentLevel and \
+                        x.levelno != levelno:
+                    break
+            else:
+                return True
+        if not logger.propagate:
+            break
+        logger = logger.parent
+
+    # Without any handler the record goes to `logging.lastResort`, leave the
+    # decision to `logging`.
+    return not found_handler
+
+
+def get_logger(gname: Optional[Logger]) -> logging.Logger:
+    if gname is None:
+        if not hasattr(gcode, "default"):
+            __init__("default", **gpack.default, gname="default")
+        return default
+
+    if gname.__class__ is str:
+        gobj: logging.Logger = getattr(gpack, gname, None)
+        if gobj.__class__ is not logging.Logger:
+            raise NameError(f"gname '{gname}' not found in '{__package__}'.")
+        return gobj
+
+    if gname.__class__ is logging.Logger:
+        return gname
+
+    raise TypeError(
+        "parameter 'gname' type must be 'str' or 'logging.Logger', "
+        f"not '{gname.__class__.__name__}'."
+    )
+
+
+# Every logger used through the logging methods of this module, keyed by its
+# `gname` (None for the default logger, see `registry`, or the `logging.Logger`
+# itself, see `logger_registry`), with what each call would otherwise compute
+# again: the bound logging methods, whether a level is recorded at all (see
+# `will_record`), the message options of the logger and its sampling filter
+# (option `sample`). Only the loggers created by `__init__` are watched, and
+# whether a level is recorded is kept only for them.
+class RegistryEntry:
+    __slots__ = (
+        "logger", "levels", "methods", "oneline", "linesep", "max_length",
+        "sampler", "watched"
+    )
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+        self.watched: bool = logger in logger_configs
+        self.levels:  Dict[int, bool]     = {}
+        self.methods: Dict[str, Callable] = {}
+        self.oneline, self.linesep, self.max_length = \
+            message_defaults.get(logger, (False, "; ", 0))
+        self.sampler: Optional[SuppressionFilter] = None
+        for x in logger.filters:
+            if x.__class__ is SuppressionFilter and x.sample is not None:
+                self.sampler = x
+
+    def method(self, name: str) -> Callable:
+        try:
+            return self.methods[name]
+        except KeyError:
+            method = self.methods[name] = getattr(self.logger, name)
+            return method
+
+
+# The entry of a `logging.Logger` key, which it must not keep alive: the logger
+# is only weakly referenced, and its methods are not kept.
+class WeakRegistryEntry(RegistryEntry):
+    __slots__ = "ref",
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self.ref()
+
+    @logger.setter
+    def logger(self, logger: logging.Logger) -> None:
+        self.ref = weakref.ref(logger)
+
+    def method(self, name: str) -> Callable:
+        return getattr(self.ref(), name)
+
+
+registry: Final[Dict[Optional[str], RegistryEntry]] = {}
+
+logger_registry: Final[
+    "weakref.WeakKeyDictionary[logging.Logger, RegistryEntry]"
+] = weakref.WeakKeyDictionary()
+
+# Options `oneline`, `linesep` and `maxMessageLength` of the loggers created by
+# `__init__`, as (oneline, linesep, max_length).
+message_defaults: Final[
+    "weakref.WeakKeyDictionary[logging.Logger, Tuple[bool, str, int]]"
+] = weakref.WeakKeyDictionary()
+
+
+def register(gname: Optional[Logger]) -> RegistryEntry:
+    if gname.__class__ is logging.Logger:
+        entry: Optional[RegistryEntry] = logger_registry.get(gname)
+        if entry is None:
+            entry = logger_registry[gname] = \
+                register_logger(gname, WeakRegistryEntry)
+        return entry
+    entry = registry[gname] = register_logger(get_logger(gname))
+    return entry
+
+
+def register_logger(
+        logger:      logging.Logger,
+        entry_class: Type[RegistryEntry] = RegistryEntry
+) -> RegistryEntry:
+    entry: RegistryEntry = entry_class(logger)
+    if entry.watched:
+        watch_logger(logger)
+    return entry
+
+
+def invalidate_registry() -> None:
+    for entry in list(registry.values()) + list(logger_registry.values()):
+        entry.levels.clear()
+        # Loggers created by `__init__` are not in `logging.Logger.manager`,
+        # whose cache clearing misses them. A weak entry may have lost its
+        # logger.
+        logger: Optional[logging.Logger] = entry.logger
+        if logger is not None:
+            logger._cache.clear()
+
+
+def invalidating(method: Callable) -> Callable:
+    def wrapper(*a, **kw):
+        try:
+            return method(*a, **kw)
+        finally:
+            invalidate_registry()
+    return wrapper
+
+
+def watch_logger(logger: logging.Logger) -> None:
+    # Setting the level of any logger, or `logging.disable`, goes through
+    # `logging.Logger.manager._clear_cache`. Changes of the handlers of our
+    # loggers are watched on the instances.
+    if "addHandler" in logger.__dict__:
+        return
+
+    add_handler: Callable = logger.addHandler
+
+    def add_handler_and_watch(handler: logging.Handler) -> None:
+        watch_handler(handler)
+        add_handler(handler)
+
+    logger.addHandler    = invalidating(add_handler_and_watch)
+    logger.removeHandler = invalidating(logger.removeHandler)
+    logger.addFilter     = invalidating(logger.addFilter)
+    logger.removeFilter  = invalidating(logger.removeFilter)
+
+    for handler in logger.handlers:
+        watch_handler(handler)
+
+
+def watch_handler(handler: logging.Handler) -> None:
+    if "setLevel" not in handler.__dict__:
+        handler.setLevel = invalidating(handler.setLevel)
+
+
+def manager_clear_cache(clear_cache: Callable[[], None]) -> Callable[[], None]:
+    def _clear_cache() -> None:
+        clear_cache()
+        invalidate_registry()
+    return _clear_cache
+
+
+logging.Logger.manager._clear_cache = \
+    manager_clear_cache(logging.Logger.manager._clear_cache)
+
+
+def make_record(
+        logger:     logging.Logger,
+        levelno:    int,
+        msg:        str,
+        exc_info:   Any               = None,
+        extra:      Optional[Mapping] = None,
+        stack_info: bool              = False,
+        stacklevel: int               = 1
+) -> logging.LogRecord:
+    # What `logging.Logger._log` does before handling the record.
+    if exc_info:
+        if isinstance(exc_info, BaseException):
+            exc_info = type(exc_info), exc_info, exc_info.__traceback__
+        elif not isinstance(exc_info, tuple):
+            exc_info = sys.exc_info()
+
+    # Whatever the version, `stacklevel` is counted as by Python 3.11+.
+    finder: Callable = find_no_caller \
+        if logger.__dict__.get("findCaller") is find_no_caller else find_caller
+    # One more level for this frame.
+    fn, lno, func, sinfo = finder(stack_info, stacklevel + 1)
+
+    return logger.makeRecord(
+        logger.name, levelno, fn, lno, msg, (), exc_info, func, extra, sinfo
+    )
+
+
+# Records of the coroutine logging methods (`ainfo`, ...) are created on the
+# event loop and handled by this writer thread. When the queue is full, the
+# coroutine waits in an executor, the event loop itself is never blocked.
+class AsyncioWriter:
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.queue: Optional["queue.Queue"] = None
+        self.loggers = weakref.WeakSet()
+        self.thread: Optional[threading.Thread] = None
+        self.lock    = threading.Lock()
+
+    def start(self) -> None:
+        with self.lock:
+            if self.thread is not None:
+                return
+            if self.queue is None:
+                import queue
+                self.queue = queue.Queue(self.maxsize)
+            self.thread = threading.Thread(
+                target=self.run, name=self.__class__.__name__, daemon=True
+            )
+            self.thread.start()
+            # After `logging.shutdown`, so it runs first.
+            atexit.register(self.stop)
+
+    def run(self) -> None:
+        # Sampled by the coroutine logging methods already.
+        presampled.active = True
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                logger, record = item
+                logger.handle(record)
+            except Exception:
+                if logging.raiseExceptions:
+                    traceback.print_exc()
+            finally:
+                self.queue.task_done()
+
+    async def put(self, logger: logging.Logger, record: logging.LogRecord):
+        import queue
+        import asyncio
+
+        if self.thread is None:
+            self.start()
+        self.loggers.add(logger)
+
+        try:
+            self.queue.put_nowait((logger, record))
+        except queue.Full:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.queue.put, (logger, record)
+            )
+
+    def flush(self) -> None:
+        if self.queue is not None:
+            self.queue.join()
+        # The queues of the async handlers, with the records logged before.
+        for listener in list(queue_listeners):
+            listener.join()
+            for handler in listener.handlers:
+                handler.flush()
+        for logger in list(self.loggers):
+            for handler in logger.handlers:
+                handler.flush()
+
+    def stop(self) -> None:
+        with self.lock:
+            if self.thread is None:
+                return
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+            atexit.unregister(self.stop)
+
+
+asyncio_writer = AsyncioWriter(10000)
+
+
+async def aflush() -> None:
+    import asyncio
+    await asyncio.get_running_loop().run_in_executor(None, asyncio_writer.flush)
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {
+        name: logger_stats.snapshot()
+        for name, logger_stats in list(stats_registry.items())
+    }
+
+
+def __getattr__(method: str) -> Closure:
+    if method.startswith("a") and method[1:] in method_levels:
+        alogger: Closure = create_coroutine_logger(method[1:])
+        setattr(gpack, method, alogger)
+        return alogger
+
+    if not hasattr(logging.Logger, method):
+        raise AttributeError(
+            f"module '{__package__}' has no attribute '{method}'"
+        )
+
+    levelno: Optional[int] = method_levels.get(method)
+
+    def logger(
+            *msg,
+            sep:     str              = " ",
+            oneline: Optional[bool]   = None,
+            linesep: Optional[str]    = None,
+            gname:   Optional[Logger] = None,
+            **kw
+    ) -> None:
+        try:
+            entry: RegistryEntry = registry[gname]
+        except (KeyError, TypeError):
+            entry: RegistryEntry = register(gname)
+
+        if levelno is not None:
+            try:
+                enabled: bool = entry.levels[levelno]
+            except KeyError:
+                enabled = will_record(entry.logger, levelno)
+                if entry.watched:
+                    entry.levels[levelno] = enabled
+            if not enabled:
+                return
+            sampler: Optional[SuppressionFilter] = entry.sampler
+            if sampler is not None and not sampler.sample_call(levelno):
+                return
+        else:
+            sampler = None
+
+        if sys.version_info >= (3, 8):
+            if "stacklevel" not in kw:
+                kw["stacklevel"] = 2
+            elif kw["stacklevel"] < 2:
+                kw["stacklevel"] = 2
+
+        if oneline is None:
+            oneline = entry.oneline
+        if linesep is None:
+            linesep = entry.linesep
+        max_length: int = entry.max_length
+
+        if len(msg) == 1 and msg[0].__class__ is str and not oneline and \
+                (not max_length or len(msg[0]) <= max_length):
+            msg: str = msg[0]
+        else:
+            msg = LazyMessage(msg, sep, oneline, linesep, max_length)
+
+        if sampler is None:
+            entry.method(method)(msg, **kw)
+            return
+        presampled.active = True
+        try:
+            entry.method(method)(msg, **kw)
+        finally:
+            presampled.active = False
+
+    logger.__name__ = logger.__qualname__ = method
+    logger.__module__ = __package__
+
+    # Bind the closure into the package, subsequent accesses are plain module
+    # attribute hits and no longer reach this function.
+    setattr(gpack, method, logger)
+
+    return logger
+
+
+def create_coroutine_logger(method: str) -> Closure:
+    levelno: int = method_levels[method]
+
+    async def alogger(
+            *msg,
+            sep:     str              = " ",
+            oneline: Optional[bool]   = None,
+            linesep: Optional[str]    = None,
+            gname:   Optional[Logger] = None,
+            **kw
+    ) -> None:
+        try:
+            entry: RegistryEntry = registry[gname]
+        except (KeyError, TypeError):
+            entry: RegistryEntry = register(gname)
+
+        gobj: logging.Logger = entry.logger
+
+        if not will_record(gobj, levelno):
+            return
+        if entry.sampler is not None and \
+                not entry.sampler.sample_call(levelno):
+            return
+
+        if method == "exception":
+            kw.setdefault("exc_info", True)
+        if kw.get("stacklevel", 1) < 2:
+            kw["stacklevel"] = 2
+
+        if oneline is None:
+            oneline = entry.oneline
+        if linesep is None:
+            linesep = entry.linesep
+
+        # Rendered here, the objects may be changed once the caller resumes.
+        msg: str = render_message(
+            msg, sep, oneline, linesep, entry.max_length
+        )
+
+        record: logging.LogRecord = make_record(gobj, levelno, msg, **kw)
+        await asyncio_writer.put(gobj, record)
+
+    alogger.__name__ = alogger.__qualname__ = "a" + method
+    alogger.__module__ = __package__
+
+    return alogger
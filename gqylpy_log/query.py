@@ -0,0 +1,477 @@
+"""
+Query the text log files written by the handlers of `gqylpy_log`, with their
+rotated and compressed backups:
+
+    $ glog-query [--since TIME] [--until TIME] [--level LEVEL]
+                 [--logger NAME] [--fmt FMT] [--datefmt FMT] FILE [FILE ...]
+
+The records are parsed with `--fmt` and `--datefmt` (a "%"-style format of
+`logging`), defaulting to the format of the default logger. TIME is a Unix
+timestamp or an ISO 8601 date and time.
+
+Each file gets a sidecar index, "FILE.idx": the file is cut into blocks of
+about 1 MiB starting at a record, with the time of the first and last record
+of every block, and for every level the blocks holding records of it. Only
+the blocks that may match are read. The index is extended when the file has
+grown, and built again when the file was replaced.
+"""
+import os
+import re
+import sys
+import json
+import mmap
+import time
+import hashlib
+import logging
+import argparse
+import datetime
+
+from typing import (
+    Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+)
+
+import gqylpy_log
+
+INDEX_VERSION = 1
+
+BLOCK_BYTES = 1 << 20
+
+
+class LogEntry(NamedTuple):
+    created:   Optional[float]
+    levelname: Optional[str]
+    name:      Optional[str]
+    text:      str
+    path:      str
+    offset:    int
+
+
+class LogFormat:
+    # Parses the first line of the records written with `fmt` and `datefmt`,
+    # the lines not parsed belong to the record before (tracebacks and the
+    # like).
+    field_patterns: Dict[str, str] = {
+        "asctime":   r"(?P<asctime>.+?)",
+        "levelname": r"(?P<levelname>[A-Z]+|Level \d+)",
+        "levelno":   r"(?P<levelno>\d+)",
+        "name":      r"(?P<name>.+?)",
+        "message":   r"(?P<message>.*)"
+    }
+
+    def __init__(self, fmt: str, datefmt: Optional[str] = None):
+        self.fmt     = fmt
+        self.datefmt = datefmt
+
+        pattern: List[str] = []
+        seen: set = set()
+        end = 0
+        for m in re.finditer(
+                r"%\((\w+)\)[-#0 +]*\d*(?:\.\d+)?[diouxXeEfFgGcrsa]", fmt
+        ):
+            pattern.append(re.escape(fmt[end:m.start()].replace("%%", "%")))
+            field: str = m.group(1)
+            if field in self.field_patterns and field not in seen:
+                pattern.append(self.field_patterns[field])
+                seen.add(field)
+            else:
+                pattern.append(r".*?")
+            end = m.end()
+        pattern.append(re.escape(fmt[end:].replace("%%", "%")) + "$")
+
+        self.header = re.compile("".join(pattern).encode())
+        self.fields = seen
+
+        if datefmt:
+            self.strptime_format: str = \
+                datefmt.replace("%F", "%Y-%m-%d").replace("%T", "%H:%M:%S")
+        else:
+            self.strptime_format = "%Y-%m-%d %H:%M:%S"
+        # With the seconds last, records of the same minute share the parsed
+        # time, strptime is slow.
+        self.minute_cached: bool = self.strptime_format.endswith("%S")
+        self.last_asctime: Optional[bytes] = None
+        self.last_time:    Optional[float] = None
+
+    def parse_time(self, asctime: bytes) -> Optional[float]:
+        msecs = 0
+        if not self.datefmt:
+            asctime, _, ms = asctime.partition(b",")
+            msecs = int(ms) if ms.isdigit() else 0
+        seconds = 0
+        if self.minute_cached and asctime[-2:].isdigit():
+            seconds = int(asctime[-2:])
+            asctime = asctime[:-2] + b"00"
+        if asctime != self.last_asctime:
+            try:
+                self.last_time = time.mktime(time.strptime(
+                    asctime.decode(), self.strptime_format
+                ))
+            except ValueError:
+                self.last_time = None
+            self.last_asctime = asctime
+        if self.last_time is None:
+            return None
+        return self.last_time + seconds + msecs / 1000
+
+    def parse(self, line: bytes) -> Optional[Tuple[
+        Optional[float], Optional[str], Optional[str]
+    ]]:
+        m = self.header.match(line)
+        if m is None:
+            return None
+        groups: Dict[str, bytes] = m.groupdict()
+        created: Optional[float] = None
+        if "asctime" in groups:
+            created = self.parse_time(groups["asctime"])
+        levelname: Optional[str] = None
+        if "levelname" in groups:
+            levelname = groups["levelname"].decode()
+        elif "levelno" in groups:
+            levelname = logging.getLevelName(int(groups["levelno"]))
+        name: Optional[str] = None
+        if "name" in groups:
+            name = groups["name"].decode("UTF-8", "replace")
+        return created, levelname, name
+
+
+def compression_opener(path: str) -> Any:
+    if path.endswith(".gz"):
+        import gzip
+        return gzip.open
+    if path.endswith(".bz2"):
+        import bz2
+        return bz2.open
+    if path.endswith(".xz"):
+        import lzma
+        return lzma.open
+    return None
+
+
+def iter_lines(
+        path:   str,
+        ranges: Iterable[Tuple[int, Optional[int]]]
+) -> Iterator[Tuple[int, bytes]]:
+    # The complete lines in the ranges [start, end) of offsets (of the
+    # uncompressed data), without line break, the ranges in ascending order.
+    # Plain files are memory-mapped, compressed files are read once forward.
+    opener = compression_opener(path)
+    if opener is not None:
+        with opener(path, "rb") as f:
+            for start, end in ranges:
+                f.seek(start)
+                position: int = start
+                while end is None or position < end:
+                    line: bytes = f.readline()
+                    if not line.endswith(b"\n"):
+                        return
+                    yield position, line[:-1]
+                    position += len(line)
+        return
+
+    with open(path, "rb") as f:
+        size: int = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+            for start, end in ranges:
+                if end is None or end > size:
+                    end = size
+                position: int = start
+                while position < end:
+                    newline: int = mm.find(b"\n", position, size)
+                    if newline == -1:
+                        return
+                    yield position, mm[position:newline]
+                    position = newline + 1
+
+
+def iter_records(
+        lines:      Iterable[Tuple[int, bytes]],
+        log_format: LogFormat
+) -> Iterator[Tuple[int, Tuple[Optional[float], Optional[str],
+                               Optional[str]], List[bytes]]]:
+    # (offset, parsed first line, lines) of every record, the lines before
+    # the first record start are skipped.
+    offset: Optional[int] = None
+    parsed = None
+    record_lines: List[bytes] = []
+
+    for position, line in lines:
+        header = log_format.parse(line)
+        if header is not None:
+            if offset is not None:
+                yield offset, parsed, record_lines
+            offset, parsed, record_lines = position, header, [line]
+        elif offset is not None:
+            record_lines.append(line)
+
+    if offset is not None:
+        yield offset, parsed, record_lines
+
+
+def file_head(path: str) -> str:
+    opener = compression_opener(path) or open
+    with opener(path, "rb") as f:
+        return hashlib.sha1(f.read(4096)).hexdigest()
+
+
+def indexed_size(path: str) -> int:
+    # The data to index, up to the last complete line. Compressed backups are
+    # not written any more, their uncompressed size is found when indexing.
+    if compression_opener(path) is not None:
+        return -1
+    with open(path, "rb") as f:
+        size: int = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return 0
+        with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+            return mm.rfind(b"\n") + 1
+
+
+def load_index(path: str, log_format: LogFormat) -> Dict[str, Any]:
+    # The index of `path`, updated and saved if the file has changed.
+    index_path: str = path + ".idx"
+    stat: os.stat_result = os.stat(path)
+
+    index: Optional[Dict[str, Any]] = None
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    if index is not None and (
+            index.get("version") != INDEX_VERSION or
+            index.get("fmt") != log_format.fmt or
+            index.get("datefmt") != log_format.datefmt
+    ):
+        index = None
+
+    compressed: bool = compression_opener(path) is not None
+    if index is not None:
+        if compressed:
+            if index["mtime"] == stat.st_mtime and \
+                    index["file_size"] == stat.st_size:
+                return index
+            index = None
+        elif index["file_size"] == stat.st_size and \
+                index["mtime"] == stat.st_mtime:
+            return index
+        elif stat.st_size < index["size"] or \
+                file_head(path) != index["head"]:
+            # Replaced, by a rotation for instance.
+            index = None
+
+    if index is None:
+        index = {
+            "version": INDEX_VERSION,
+            "fmt":     log_format.fmt,
+            "datefmt": log_format.datefmt,
+            "size":    0,
+            "blocks":  [],
+            "levels":  {}
+        }
+
+    # Continue from the start of the last block, which may have grown.
+    blocks: List[list] = index["blocks"]
+    levels: Dict[str, List[int]] = index["levels"]
+    start: int = 0
+    if blocks:
+        start = blocks.pop()[0]
+        last: int = len(blocks)
+        for numbers in levels.values():
+            while numbers and numbers[-1] >= last:
+                numbers.pop()
+
+    end: int = indexed_size(path)
+    block: Optional[list] = None
+    record_end: int = start
+    for offset, (created, levelname, _), lines in iter_records(
+            iter_lines(path, [(start, end if end >= 0 else None)]), log_format
+    ):
+        if block is None or offset >= block[0] + BLOCK_BYTES:
+            if block is not None:
+                block[1] = offset
+            block = [offset, offset, created, created]
+            blocks.append(block)
+        if created is not None:
+            if block[2] is None:
+                block[2] = created
+            block[3] = created
+        if levelname is not None:
+            numbers: List[int] = levels.setdefault(levelname, [])
+            if not numbers or numbers[-1] != len(blocks) - 1:
+                numbers.append(len(blocks) - 1)
+        record_end = offset + sum(len(x) + 1 for x in lines)
+    if block is not None:
+        block[1] = record_end
+
+    index["size"]      = end if end >= 0 else record_end
+    index["file_size"] = stat.st_size
+    index["mtime"]     = stat.st_mtime
+    index["head"]      = file_head(path)
+
+    try:
+        with open(index_path + ".tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(index_path + ".tmp", index_path)
+    except OSError:
+        # A read-only directory, the index is used once.
+        pass
+
+    return index
+
+
+def log_files(path: str) -> List[str]:
+    # `path` and its rotated backups, compressed or not.
+    dirname, basename = os.path.split(os.path.abspath(path))
+    files: List[str] = [path] if os.path.exists(path) else []
+    for filename in os.listdir(dirname):
+        if filename.startswith(basename + ".") and not filename.endswith(
+                (".idx", ".tmp", ".part", ".lock")
+        ):
+            files.append(os.path.join(dirname, filename))
+    return files
+
+
+def query(
+        files:   Union[str, Iterable[str]],
+        since:   Optional[float]       = None,
+        until:   Optional[float]       = None,
+        level:   Union[int, str, None] = None,
+        logger:  Optional[str]         = None,
+        fmt:     Optional[str]         = None,
+        datefmt: Optional[str]         = None
+) -> Iterator[LogEntry]:
+    # The records of the log files `files` (with their backups) created in
+    # [since, until), at or above `level`, of logger `logger` or its children,
+    # oldest file first. The arguments are checked before it returns.
+    if fmt is None:
+        formatter_params: dict = gqylpy_log.default["formatter"]
+        fmt, datefmt = formatter_params["fmt"], formatter_params.get("datefmt")
+
+    log_format = LogFormat(fmt, datefmt)
+    if logger is not None and "name" not in log_format.fields:
+        raise ValueError("parameter 'logger' needs '%(name)s' in the format.")
+
+    levelno: int = logging._checkLevel(level) if level is not None else 0
+
+    if isinstance(files, str):
+        files = [files]
+
+    return query_files(files, since, until, levelno, logger, log_format)
+
+
+def query_files(
+        files:      Iterable[str],
+        since:      Optional[float],
+        until:      Optional[float],
+        levelno:    int,
+        logger:     Optional[str],
+        log_format: LogFormat
+) -> Iterator[LogEntry]:
+    indexes: List[Tuple[str, Dict[str, Any]]] = []
+    for path in files:
+        for x in log_files(path):
+            indexes.append((x, load_index(x, log_format)))
+
+    def first_time(item: Tuple[str, Dict[str, Any]]) -> float:
+        for block in item[1]["blocks"]:
+            if block[2] is not None:
+                return block[2]
+        return float("inf")
+
+    indexes.sort(key=first_time)
+
+    for path, index in indexes:
+        selected: Optional[set] = None
+        if levelno:
+            selected = set()
+            for levelname, numbers in index["levels"].items():
+                x = logging.getLevelName(levelname)
+                if not isinstance(x, int) or x >= levelno:
+                    selected.update(numbers)
+
+        # Adjacent blocks are read as one range.
+        ranges: List[List[int]] = []
+        for number, (start, end, first, last) in enumerate(index["blocks"]):
+            if selected is not None and number not in selected:
+                continue
+            if since is not None and last is not None and last < since:
+                continue
+            if until is not None and first is not None and first >= until:
+                continue
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = end
+            else:
+                ranges.append([start, end])
+
+        for offset, (created, levelname, name), lines in iter_records(
+                iter_lines(path, ranges), log_format
+        ):
+            if since is not None and (created is None or created < since):
+                continue
+            if until is not None and (
+                    created is None or created >= until
+            ):
+                continue
+            if levelno:
+                x = logging.getLevelName(levelname) \
+                    if levelname is not None else None
+                if isinstance(x, int) and x < levelno:
+                    continue
+            if logger is not None and name != logger and \
+                    not (name or "").startswith(logger + "."):
+                continue
+            yield LogEntry(
+                created, levelname, name,
+                b"\n".join(lines).decode("UTF-8", "replace"), path, offset
+            )
+
+
+def parse_time(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="glog-query",
+        description=__doc__.strip().split("\n\n")[0].strip(":")
+    )
+    parser.add_argument("files", nargs="+", metavar="FILE")
+    parser.add_argument("--since", type=parse_time, metavar="TIME")
+    parser.add_argument("--until", type=parse_time, metavar="TIME")
+    parser.add_argument("--level", help="the lowest level, e.g. WARNING")
+    parser.add_argument("--logger", help="a logger name, with its children")
+    parser.add_argument("--fmt")
+    parser.add_argument("--datefmt")
+    args = parser.parse_args(argv)
+
+    level: Union[int, str, None] = args.level
+    if level is not None and level.isdigit():
+        level = int(level)
+
+    try:
+        entries: Iterator[LogEntry] = query(
+            args.files, args.since, args.until, level, args.logger, args.fmt,
+            args.datefmt
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    write = sys.stdout.write
+    try:
+        for entry in entries:
+            write(entry.text + "\n")
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # Piped into `head` and the like.
+        sys.stderr.close()
+
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(errors="backslashreplace")
+    main()
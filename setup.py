@@ -27,6 +27,9 @@ setuptools.setup(
     long_description=open("README.md", encoding="utf8").read(),
     long_description_content_type="text/markdown",
     packages=[g.__name__],
+    entry_points={"console_scripts": [
+        f"glog-query = {g.__name__}.query:main"
+    ]},
     python_requires=">=3.8",
     classifiers=[
         "Development Status :: 3 - Alpha",
@@ -0,0 +1,61 @@
+import logging
+
+gcode = __import__("gqylpy_log.g log", fromlist=...)
+
+
+def make_record(**kw) -> logging.LogRecord:
+    return logging.makeLogRecord(
+        {"msg": "message", "levelno": logging.INFO, "levelname": "INFO", **kw}
+    )
+
+
+def test_create_formatter_compiled():
+    params = {"fmt": "%(levelname)s %(message)s"}
+    record = make_record()
+
+    formatter = gcode.create_formatter({**params, "compiled": True})
+    assert formatter.__class__ is gcode.CompiledFormatter
+
+    for compiled in False, None:
+        formatter = gcode.create_formatter({**params, "compiled": compiled})
+        assert formatter.__class__ is logging.Formatter
+        assert formatter.format(record) == "INFO message"
+
+
+def test_create_json_formatter_compiled():
+    for compiled in True, False:
+        formatter = gcode.create_formatter(
+            {"style": "json", "fields": ["message"], "compiled": compiled}
+        )
+        assert formatter.format(make_record()) == '{"message":"message"}'
+
+
+def test_json_formatter_non_finite_floats():
+    import json
+
+    formatter = gcode.create_formatter(
+        {"style": "json", "fields": ["n", "values"]}
+    )
+    record = make_record(
+        n=float("nan"), values={"a": [float("inf"), -float("inf"), 1.5]}
+    )
+    text: str = formatter.format(record)
+
+    assert json.loads(text, parse_constant=lambda x: 1 / 0) == {
+        "n": "nan", "values": {"a": ["inf", "-inf", 1.5]}
+    }
+
+
+def test_json_formatter_ignores_fmt():
+    import json
+    import gqylpy_log as glog
+
+    formatter = gcode.create_formatter(
+        {"fmt": "%(message)s", "style": "json", "fields": ["message"]}
+    )
+    assert formatter.format(make_record()) == '{"message":"message"}'
+
+    # The default formatter switched to JSON.
+    params = {**glog.default["formatter"], "style": "json"}
+    record = json.loads(gcode.create_formatter(params).format(make_record()))
+    assert record["message"] == "message"
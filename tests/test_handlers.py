@@ -0,0 +1,465 @@
+import logging
+
+gcode = __import__("gqylpy_log.g log", fromlist=...)
+
+
+def test_buffered_file_handler_without_file_handler_errors(
+        tmp_path, monkeypatch
+):
+    # `FileHandler` has no parameter `errors` before Python 3.9.
+    file_handler_init = logging.FileHandler.__init__
+
+    def init(self, filename, mode="a", encoding=None, delay=False):
+        file_handler_init(self, filename, mode, encoding, delay)
+
+    monkeypatch.setattr(logging.FileHandler, "__init__", init)
+
+    handler = gcode.BufferedFileHandler(
+        str(tmp_path / "a.log"), encoding="ascii", errors="replace",
+        flush_interval=0
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    handler.handle(logging.makeLogRecord({"msg": "caf\xe9"}))
+    handler.close()
+
+    assert (tmp_path / "a.log").read_bytes() == b"caf?\n"
+
+
+def test_collector_handler_reports_dropped_records(tmp_path):
+    import os
+    import json
+
+    handler = gcode.CollectorHandler(
+        "collected", 0, {"fmt": "%(message)s"},
+        {"collector": str(tmp_path / "collector.sock")}, []
+    )
+    handler.handleError = lambda record: None
+    sent = []
+
+    class Connection:
+        send_bytes = sent.append
+
+    def connect_fails():
+        raise OSError
+
+    def connect():
+        handler.conn, handler.pid = Connection(), os.getpid()
+
+    handler.connect = connect_fails
+    for i in range(3):
+        handler.handle(logging.makeLogRecord({"msg": i}))
+    assert handler.dropped == 3
+
+    handler.connect = connect
+    handler.retry_time = 0
+    handler.handle(logging.makeLogRecord({"msg": "back"}))
+
+    messages = [json.loads(x)["msg"] for x in sent]
+    assert messages == [
+        f"3 records dropped, the collector {handler.address!r} was "
+        f"unreachable",
+        "back"
+    ]
+    assert handler.dropped == 0
+
+
+def test_duplicate_filter_summary_after_window():
+    import time
+
+    class ListHandler(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.messages = []
+
+        def emit(self, record):
+            self.messages.append(record.getMessage())
+
+    handler = ListHandler()
+    handler.addFilter(gcode.DuplicateFilter(handler, 0.2))
+
+    for _ in range(5):
+        handler.handle(logging.makeLogRecord({"msg": "storm"}))
+    assert handler.messages == ["storm"]
+
+    # No later record arrives, the timer writes the summary.
+    time.sleep(0.5)
+    assert handler.messages == ["storm", "last message repeated 4 times."]
+
+
+def test_compressed_rotating_backups_are_not_overwritten(
+        tmp_path, monkeypatch
+):
+    import time
+    import lzma
+    from logging.handlers import RotatingFileHandler
+
+    compress = gcode.Compressor.compress
+
+    def slow_compress(*args):
+        time.sleep(0.01)
+        compress(*args)
+
+    monkeypatch.setattr(
+        gcode.Compressor, "compress", staticmethod(slow_compress)
+    )
+
+    handler = RotatingFileHandler(
+        str(tmp_path / "a.log"), maxBytes=2000, backupCount=1000
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    gcode.set_compression(handler, "xz")
+
+    # Rolled over faster than compressed, backup 1 is still pending when the
+    # next rollover happens.
+    for i in range(2000):
+        handler.handle(logging.makeLogRecord({"msg": f"line {i:05d}"}))
+    handler.close()
+    gcode.compressor.stop()
+
+    lines = (tmp_path / "a.log").read_text().splitlines()
+    for path in tmp_path.glob("a.log.*.xz"):
+        lines += lzma.decompress(path.read_bytes()).decode().splitlines()
+    assert sorted(lines) == [f"line {i:05d}" for i in range(2000)]
+
+    # The newest backup is 1.
+    last = lzma.decompress((tmp_path / "a.log.1.xz").read_bytes()).decode()
+    first = (tmp_path / "a.log").read_text().splitlines()[0]
+    assert last.splitlines()[-1] < first
+
+
+def test_tail_buffer_per_asyncio_task():
+    import asyncio
+
+    class ListHandler(logging.Handler):
+        def __init__(self):
+            super().__init__(logging.INFO)
+            self.messages = []
+
+        def emit(self, record):
+            self.messages.append(record.getMessage())
+
+    target = ListHandler()
+    handler = gcode.TailBufferHandler(target, 10)
+
+    def log(level, msg):
+        handler.handle(logging.makeLogRecord({"levelno": level, "msg": msg}))
+
+    async def request(i):
+        log(logging.DEBUG, f"req {i} step")
+        await asyncio.sleep(0)
+        if i == 3:
+            log(logging.ERROR, f"req {i} failed")
+
+    async def main():
+        log(logging.DEBUG, "startup")
+        await asyncio.gather(*(request(i) for i in (1, 2, 3)))
+
+    asyncio.run(main())
+
+    assert target.messages == ["req 3 step", "req 3 failed"]
+
+
+def test_binary_file_handler_custom_levels(tmp_path):
+    logger = logging.Logger("test_binary")
+    handler = gcode.BinaryFileHandler(str(tmp_path / "a.glog"))
+    logger.addHandler(handler)
+    logger.log(300, "above critical")
+    logger.log(5, "below debug")
+    handler.close()
+
+    with open(tmp_path / "a.glog", "rb") as file:
+        records = list(gcode.read_binary_log(file))
+    assert [(x.levelno, x.getMessage()) for x in records] == \
+        [(300, "above critical"), (5, "below debug")]
+
+
+def shared_formatter_logger(tmp_path, gname, the_filter):
+    import gqylpy_log as glog
+
+    formatter = {"fmt": "%(levelname)s %(message)s"}
+    return glog.__init__(
+        gname, level="INFO", handlers=[
+            {"name": "FileHandler", "filename": str(tmp_path / "a.log"),
+             "formatter": formatter},
+            {"name": "FileHandler", "filename": str(tmp_path / "b.log"),
+             "formatter": formatter, "filters": [the_filter]},
+            {"name": "FileHandler", "filename": str(tmp_path / "c.log"),
+             "formatter": formatter}
+        ], gname=gname
+    )
+
+
+def test_shared_formatter_with_redaction_filter(tmp_path):
+    def redact(record):
+        record.args["pw"] = "***"
+        return True
+
+    logger = shared_formatter_logger(tmp_path, "test_redaction", redact)
+    logger.info("pw=%(pw)s", {"pw": "hunter2"})
+
+    assert (tmp_path / "a.log").read_text() == "INFO pw=hunter2\n"
+    assert (tmp_path / "b.log").read_text() == "INFO pw=***\n"
+    # As with `logging`, the handlers after it see the changed record.
+    assert (tmp_path / "c.log").read_text() == "INFO pw=***\n"
+
+
+def test_shared_formatter_with_filter_changing_attributes(tmp_path):
+    def mark(record):
+        record.levelname = f"<{record.levelname}>"
+        return True
+
+    logger = shared_formatter_logger(tmp_path, "test_mark", mark)
+    logger.info("message")
+
+    assert (tmp_path / "a.log").read_text() == "INFO message\n"
+    assert (tmp_path / "b.log").read_text() == "<INFO> message\n"
+
+
+def test_formatters_passed_in_are_not_changed(tmp_path):
+    import gqylpy_log as glog
+
+    formatter = logging.Formatter("%(message)s")
+    logger = glog.__init__(
+        "test_passed_formatter", level="INFO", formatter=formatter,
+        handlers=[
+            {"name": "FileHandler", "filename": str(tmp_path / f"{i}.log")}
+            for i in range(2)
+        ]
+    )
+    logger.info("message")
+
+    assert "format" not in formatter.__dict__
+    assert (tmp_path / "1.log").read_text() == "message\n"
+
+
+def info(msg):
+    return logging.makeLogRecord(
+        {"msg": msg, "levelno": logging.INFO, "levelname": "INFO"}
+    )
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class GatedHandler(ListHandler):
+    # Handles nothing until `gate` is set.
+
+    def __init__(self):
+        super().__init__()
+        import threading
+        self.gate = threading.Event()
+
+    def emit(self, record):
+        self.gate.wait()
+        super().emit(record)
+
+
+def test_queue_listener_survives_failing_handler(capsys):
+    class FailingHandler(ListHandler):
+        def emit(self, record):
+            if record.getMessage() == "fail":
+                raise RuntimeError("fail")
+            super().emit(record)
+
+    target = FailingHandler()
+    handler = gcode.start_queue_listener([target], 2, "block")
+    for msg in "a", "fail", "b", "c", "d":
+        handler.handle(info(msg))
+    handler.flush()
+
+    assert target.messages == ["a", "b", "c", "d"]
+    assert handler.listener.thread.is_alive()
+    assert "RuntimeError" in capsys.readouterr().err
+    handler.listener.stop()
+
+
+def test_queue_listener_join_returns_when_thread_died(monkeypatch):
+    import threading
+    monkeypatch.setattr(threading, "excepthook", lambda args: None)
+
+    target = ListHandler()
+    handler = gcode.start_queue_listener([target], 0, "block")
+    handler.listener.handle = lambda record: exec("raise SystemExit")
+    handler.handle(info("a"))
+    handler.listener.thread.join(5)
+    handler.handle(info("b"))
+
+    handler.flush()
+    assert not handler.listener.thread.is_alive()
+    handler.listener.stop()
+
+
+def test_async_overflow_drop_newest():
+    import time
+
+    target = GatedHandler()
+    handler = gcode.start_queue_listener([target], 2, "dropNewest")
+    handler.handle(info("0"))
+    while handler.queue.qsize():
+        time.sleep(.01)
+    for i in range(1, 10):
+        handler.handle(info(str(i)))
+    target.gate.set()
+    handler.flush()
+
+    # One record is taken by the listener, two wait in the queue.
+    assert target.messages == ["0", "1", "2"]
+    assert handler.dropped == 7
+    handler.listener.stop()
+
+
+def test_async_overflow_drop_oldest():
+    import time
+
+    target = GatedHandler()
+    handler = gcode.start_queue_listener([target], 2, "dropOldest")
+    handler.handle(info("0"))
+    while handler.queue.qsize():
+        time.sleep(.01)
+    for i in range(1, 10):
+        handler.handle(info(str(i)))
+    target.gate.set()
+    handler.flush()
+
+    assert target.messages == ["0", "8", "9"]
+    assert handler.dropped == 7
+    handler.listener.stop()
+
+
+def test_async_overflow_block():
+    import threading
+
+    target = GatedHandler()
+    handler = gcode.start_queue_listener([target], 2, "block")
+    thread = threading.Thread(target=lambda: [
+        handler.handle(info(str(i)))
+        for i in range(10)
+    ])
+    thread.start()
+    thread.join(.2)
+    # The logging thread waits for room in the queue.
+    assert thread.is_alive()
+    target.gate.set()
+    thread.join()
+    handler.flush()
+
+    assert target.messages == [str(i) for i in range(10)]
+    assert handler.dropped == 0
+    handler.listener.stop()
+
+
+def test_async_handler_drained_at_exit(tmp_path):
+    import os
+    import sys
+    import subprocess
+
+    code = (
+        "import time, logging, gqylpy_log as glog\n"
+        "class Slow(logging.FileHandler):\n"
+        "    def emit(self, record):\n"
+        "        time.sleep(.001)\n"
+        "        super().emit(record)\n"
+        f"handler = Slow({str(tmp_path / 'a.log')!r})\n"
+        "glog.__init__('exit', level='INFO', handlers=[handler],\n"
+        "              formatter={'fmt': '%(message)s'},\n"
+        "              options={'async': True}, gname='exit')\n"
+        "for i in range(500):\n"
+        "    glog.info(i, gname='exit')\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run(
+        [sys.executable, "-c", code], cwd=root, check=True,
+        env=dict(os.environ, PYTHONPATH=root)
+    )
+
+    lines = (tmp_path / "a.log").read_text().splitlines()
+    assert lines == [str(i) for i in range(500)]
+
+
+def mmap_child(tmp_path, code: str):
+    import os
+    import sys
+    import subprocess
+
+    code = (
+        "import os, signal, logging, gqylpy_log as glog\n"
+        "logger = glog.__init__(\n"
+        "    'mmap', level='INFO', formatter={'fmt': '%(message)s'},\n"
+        "    handlers=[{'name': 'MmapFileHandler', 'segment_bytes': 1,\n"
+        f"               'filename': {str(tmp_path / 'a.log')!r}}}]\n"
+        ")\n"
+        "def line(i):\n"
+        "    logger.info('%d %s', i, 'x' * (i % 100))\n"
+    ) + code
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen(
+        [sys.executable, "-c", code], cwd=root,
+        env=dict(os.environ, PYTHONPATH=root)
+    )
+
+
+def check_mmap_reopened(tmp_path) -> None:
+    # Appending again, then reading the file back: whole lines, in order.
+    import gqylpy_log as glog
+
+    logger = glog.__init__("mmap", formatter={"fmt": "%(message)s"}, handlers=[
+        {"name": "MmapFileHandler", "segment_bytes": 1,
+         "filename": str(tmp_path / "a.log")}
+    ])
+    logger.warning("after")
+    logger.handlers[0].close()
+
+    data = (tmp_path / "a.log").read_bytes()
+    assert b"\0" not in data
+    lines = data.decode().split("\n")
+    assert lines[-2:] == ["after", ""]
+    assert len(lines) > 100
+    assert lines[:-2] == [
+        f"{i} {'x' * (i % 100)}" for i in range(len(lines) - 2)
+    ]
+
+
+def test_mmap_file_handler_killed_mid_record(tmp_path):
+    # The record written when the process dies is partial: it is dropped. Some
+    # of them span the start of a new segment.
+    import mmap
+
+    for partial in b"", b"1000 xx", b"x" * (mmap.ALLOCATIONGRANULARITY + 1):
+        (tmp_path / "a.log").unlink(missing_ok=True)
+        child = mmap_child(tmp_path, (
+            "for i in range(1000):\n"
+            "    line(i)\n"
+            f"logger.handlers[0].stream.write({partial!r})\n"
+            "os.kill(os.getpid(), signal.SIGKILL)\n"
+        ))
+        assert child.wait() == -9
+        check_mmap_reopened(tmp_path)
+
+
+def test_mmap_file_handler_killed_while_writing(tmp_path):
+    import time
+
+    child = mmap_child(tmp_path, (
+        "i = 0\n"
+        "while True:\n"
+        "    line(i)\n"
+        "    i += 1\n"
+    ))
+    try:
+        # Killed once some segments were written, at any point of a record.
+        deadline = time.monotonic() + 30
+        while not (tmp_path / "a.log").exists() or \
+                (tmp_path / "a.log").read_bytes().count(b"\n") < 20000:
+            assert time.monotonic() < deadline
+            time.sleep(.01)
+    finally:
+        child.kill()
+        child.wait()
+    check_mmap_reopened(tmp_path)
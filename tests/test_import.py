@@ -0,0 +1,25 @@
+import os
+import sys
+import subprocess
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_defers_optional_modules():
+    # Only the handlers and options using them import these modules.
+    deferred = (
+        "logging.handlers", "queue", "mmap", "random", "struct",
+        "contextvars", "locale", "json"
+    )
+    code = (
+        "import sys, gqylpy_log as glog\n"
+        "glog.debug('message')\n"
+        f"print(','.join(x for x in {deferred!r} if x in sys.modules))\n"
+    )
+    process = subprocess.run(
+        [sys.executable, "-c", code], cwd=root,
+        env=dict(os.environ, PYTHONPATH=root),
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+    assert process.returncode == 0, process.stderr
+    assert process.stdout.strip() == ""
@@ -0,0 +1,413 @@
+import os
+import logging
+
+import gqylpy_log as glog
+
+gcode = __import__("gqylpy_log.g log", fromlist=...)
+
+
+def records_of(logger: logging.Logger) -> list:
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger.addHandler(handler)
+    return records
+
+
+def test_find_caller_off():
+    logger = glog.__init__("find-caller-off", options={"findCaller": "off"})
+    records = records_of(logger)
+    logger.warning("message")
+    assert records[0].funcName == "(unknown function)"
+    assert records[0].lineno == 0
+
+
+def test_find_caller_auto_without_caller_fields():
+    logger = glog.__init__(
+        "find-caller-auto",
+        formatter={"fmt": "%(message)s"},
+        handlers=[logging.NullHandler()],
+        options={"findCaller": "auto"}
+    )
+    records = records_of(logger)
+    logger.warning("message")
+    assert records[0].funcName == "(unknown function)"
+
+
+def test_find_caller_fast():
+    logger = glog.__init__("find-caller-fast", options={"findCaller": "fast"})
+    records = records_of(logger)
+    logger.warning("message")
+    assert records[0].funcName == "test_find_caller_fast"
+
+
+def test_find_caller_fast_matches_logging():
+    fast = glog.__init__(
+        "find-caller-fast-logging", options={"findCaller": "fast"}
+    )
+    assert "findCaller" in fast.__dict__
+    plain = logging.Logger("find-caller-plain")
+    fast_records, plain_records = records_of(fast), records_of(plain)
+
+    def call(logger, method, stacklevel):
+        if method == "log":
+            logger.log(logging.INFO, "message", stacklevel=stacklevel)
+        else:
+            getattr(logger, method)(
+                "message", stacklevel=stacklevel, stack_info=True
+            )
+
+    def nested(logger, method, stacklevel):
+        call(logger, method, stacklevel)
+
+    for method in "warning", "exception", "log":
+        for stacklevel in 1, 2, 3, 4, 1000:
+            for logger in fast, plain:
+                nested(logger, method, stacklevel)
+
+    def caller(record):
+        return record.pathname, record.lineno, record.funcName, \
+            record.stack_info
+
+    assert len(fast_records) == 15
+    assert list(map(caller, fast_records)) == list(map(caller, plain_records))
+
+
+def test_aflush_waits_for_async_handlers(tmp_path):
+    import time
+    import asyncio
+
+    class SlowHandler(logging.FileHandler):
+        def emit(self, record):
+            time.sleep(.005)
+            super().emit(record)
+
+    handler = SlowHandler(str(tmp_path / "a.log"))
+    glog.__init__(
+        "aflush",
+        formatter={"fmt": "%(message)s"},
+        handlers=[handler],
+        options={"async": True},
+        gname="test_aflush"
+    )
+
+    async def main():
+        for i in range(20):
+            await glog.ainfo(i, gname="test_aflush")
+        glog.info(20, gname="test_aflush")
+        await glog.aflush()
+
+    asyncio.run(main())
+    # The coroutine records go through the writer thread first.
+    lines = (tmp_path / "a.log").read_text().splitlines()
+    assert sorted(lines, key=int) == [str(i) for i in range(21)]
+
+
+def test_module_getattr_default():
+    assert not hasattr(glog, "")
+    assert getattr(glog, "", None) is None
+    assert getattr(glog, "a", None) is None
+
+
+def test_stdlib_logger_follows_parent_handler_level():
+    records = []
+
+    class ListHandler(logging.Handler):
+        def emit(self, record):
+            records.append(record.getMessage())
+
+    handler = ListHandler(logging.WARNING)
+    parent = logging.getLogger("test_parent")
+    parent.setLevel(logging.DEBUG)
+    parent.propagate = False
+    parent.addHandler(handler)
+
+    lg = logging.getLogger("test_parent.child")
+    glog.info("dropped", gname=lg)
+    handler.setLevel(logging.INFO)
+    glog.info("recorded", gname=lg)
+
+    assert records == ["recorded"]
+
+
+
+def sampled_logger(gname: str, options: dict) -> tuple:
+    import random
+    random.seed(0)
+    logger = glog.__init__(gname, level="INFO", options=options, gname=gname)
+    return logger, records_of(logger)
+
+
+def test_sample():
+    logger, records = sampled_logger("test_sample", {"sample": .1})
+    for i in range(2000):
+        glog.info(i, gname="test_sample")
+    assert 100 < len(records) < 300
+
+
+def test_sample_once_per_call():
+    logger, records = sampled_logger("test_sample_once", {"sample": .5})
+    for i in range(4000):
+        glog.info(i, gname="test_sample_once")
+    assert 1800 < len(records) < 2200
+
+    del records[:]
+    for i in range(4000):
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(i)
+    assert 1800 < len(records) < 2200
+
+
+def test_sample_coroutine_methods():
+    import asyncio
+
+    logger, records = sampled_logger("test_sample_async", {"sample": .1})
+
+    async def main():
+        for i in range(2000):
+            await glog.ainfo(i, gname="test_sample_async")
+        await glog.aflush()
+
+    asyncio.run(main())
+    assert 100 < len(records) < 300
+
+
+def test_rate_limit_and_summary():
+    import time
+
+    logger, records = sampled_logger("test_rate_limit", {
+        "rateLimit": {"per_second": 1e-9, "burst": 5},
+        "suppressedSummary": .1
+    })
+    for i in range(100):
+        glog.info(i, gname="test_rate_limit")
+    assert [x.getMessage() for x in records] == ["0", "1", "2", "3", "4"]
+
+    time.sleep(.2)
+    glog.warning("after", gname="test_rate_limit")
+    summary = records[5]
+    assert summary.getMessage() == \
+        "95 messages suppressed by sampling or rate limiting."
+    assert summary.levelno == logging.INFO
+    # Another call site, with a bucket of its own.
+    assert [x.getMessage() for x in records[6:]] == ["after"]
+
+
+def test_stdlib_logger_not_patched_nor_kept():
+    import gc
+    import weakref
+
+    lg = logging.Logger("test_stdlib_not_patched")
+    records = records_of(lg)
+    glog.info("message", gname=lg)
+
+    assert [x.getMessage() for x in records] == ["message"]
+    assert not {"addHandler", "removeHandler", "addFilter", "removeFilter"} \
+        & set(lg.__dict__)
+
+    ref = weakref.ref(lg)
+    del lg, records
+    gc.collect()
+    assert ref() is None
+
+
+def baseline_oneline(msg: tuple, sep: str, linesep: str) -> str:
+    # The former `oneline`, after line breaks "\r\n" and "\r" became "\n".
+    msg = sep.join(str(m) for m in msg)
+    msg = msg.replace("\r\n", "\n").replace("\r", "\n")
+    return linesep.join(
+        m.strip() for m in msg.split("\n") if m and not m.isspace()
+    )
+
+
+def test_oneline_matches_baseline():
+    import random
+
+    rand = random.Random(0)
+    alphabet = ["a", "b", " ", "\t", "\n", "\r", "\r\n", "\x0b", " "]
+
+    def text(n: int) -> str:
+        return "".join(rand.choice(alphabet) for _ in range(rand.randint(0, n)))
+
+    for _ in range(20000):
+        msg = tuple(text(8) for _ in range(rand.randint(1, 4)))
+        if rand.random() < .2:
+            msg += (rand.choice([0, None, 1.5]),)
+        sep = rand.choice([" ", "", "\n", " \r\n ", "-"])
+        linesep = rand.choice(["; ", "|", ""])
+        expected = baseline_oneline(msg, sep, linesep)
+        assert gcode.render_message(msg, sep, True, linesep, 0) == expected, \
+            (msg, sep, linesep)
+
+        for max_length in range(1, len(expected) + 2):
+            got = gcode.render_message(msg, sep, True, linesep, max_length)
+            if len(expected) > max_length:
+                assert got == expected[:max_length] + "...", \
+                    (msg, sep, linesep, max_length)
+            else:
+                assert got == expected, (msg, sep, linesep, max_length)
+
+
+def test_oneline_line_breaks():
+    render = gcode.render_message
+    assert render(("a\r\nb\rc\n\rd",), " ", True, "; ", 0) == "a; b; c; d"
+    assert render((" a \r\n\r\n b ",), " ", True, "; ", 0) == "a; b"
+    assert render(("a\r", "\nb"), "", True, "; ", 0) == "a; b"
+    assert render(("a", "b"), "\r\n", True, " | ", 0) == "a | b"
+    assert render(("a  b\tc",), " ", True, "; ", 0) == "a  b\tc"
+    assert render(("\r\n", " "), "\r", True, "; ", 0) == ""
+
+
+def test_max_message_length():
+    render = gcode.render_message
+    assert render(("abc", "def"), ", ", False, "; ", 4) == "abc,..."
+    assert render(("abc", "def"), ", ", False, "; ", 5) == "abc, ..."
+    assert render(("abc", "def"), ", ", False, "; ", 8) == "abc, def"
+    # Cut inside `linesep`.
+    assert render(("abc\ndef",), " ", True, " <> ", 5) == "abc <..."
+    assert render(("abc", "def"), "\n", True, " <> ", 4) == "abc ..."
+    # Cut inside a run of line breaks.
+    assert render(("abc\r\n\r\n\n  def",), " ", True, "; ", 3) == "abc..."
+    assert render(("abc\r\n\r\n\n  def",), " ", True, "; ", 4) == "abc;..."
+    assert render(("abc\r\n\r\n\n  def",), " ", True, "; ", 6) == "abc; d..."
+    # Trailing space never counts.
+    assert render(("abc \n ",), " ", True, "; ", 3) == "abc"
+
+
+def test_logger_options_oneline_and_max_length():
+    logger = glog.__init__("test_oneline_options", options={
+        "oneline": True, "linesep": " | ", "maxMessageLength": 10
+    }, gname="test_oneline_options")
+    records = records_of(logger)
+
+    glog.info("a\r\nb", gname="test_oneline_options")
+    glog.info("a\nb", oneline=False, gname="test_oneline_options")
+    glog.info("x" * 20, gname="test_oneline_options")
+
+    assert [x.getMessage() for x in records] == \
+        ["a | b", "a\nb", "x" * 10 + "..."]
+
+
+def test_reconfigure_keeps_handlers(tmp_path):
+    file = tmp_path / "a.log"
+    logger = glog.__init__(
+        "test_reconfigure", level="INFO",
+        handlers=[{"name": "FileHandler", "filename": str(file)}],
+        gname="test_reconfigure"
+    )
+    handler = logger.handlers[0]
+    stream = handler.stream
+
+    glog.debug("one", gname="test_reconfigure")
+    glog.reconfigure("test_reconfigure", level="DEBUG")
+    glog.debug("two", gname="test_reconfigure")
+    glog.reconfigure(
+        "test_reconfigure", formatter={"fmt": "%(levelname)s %(message)s"}
+    )
+    glog.debug("three", gname="test_reconfigure")
+
+    assert logger.handlers == [handler]
+    assert handler.stream is stream
+    assert file.read_text() == "two\nDEBUG three\n"
+
+
+def test_reconfigure_async_on_and_off(tmp_path):
+    file = tmp_path / "a.log"
+    logger = glog.__init__(
+        "test_reconfigure_async",
+        handlers=[{"name": "FileHandler", "filename": str(file)}],
+        gname="test_reconfigure_async"
+    )
+    handler = logger.handlers[0]
+
+    glog.reconfigure("test_reconfigure_async", options={"async": True})
+    queue_handler = logger.handlers[0]
+    assert queue_handler.__class__ is gcode.AsyncQueueHandler
+    assert queue_handler.listener.handlers == (handler,)
+    for i in range(100):
+        glog.info(i, gname="test_reconfigure_async")
+
+    glog.reconfigure("test_reconfigure_async", options={})
+    assert logger.handlers == [handler]
+    assert queue_handler.listener.thread is None
+    assert queue_handler.listener not in gcode.queue_listeners
+    glog.info("sync", gname="test_reconfigure_async")
+
+    assert file.read_text().split() == [str(i) for i in range(100)] + ["sync"]
+
+
+def test_reconfigure_closes_unused_handlers(tmp_path):
+    logger = glog.__init__(
+        "test_reconfigure_close",
+        handlers=[{"name": "FileHandler", "filename": str(tmp_path / "a.log")}],
+        gname="test_reconfigure_close"
+    )
+    old = logger.handlers[0]
+
+    glog.reconfigure("test_reconfigure_close", handlers=[
+        {"name": "FileHandler", "filename": str(tmp_path / "b.log")}
+    ])
+    glog.info("message", gname="test_reconfigure_close")
+
+    assert old.stream is None
+    assert logger.handlers[0] is not old
+    assert (tmp_path / "a.log").read_text() == ""
+    assert (tmp_path / "b.log").read_text() == "message\n"
+
+
+def test_reconfigure_keeps_methods_set_by_caller():
+    records = []
+    handler = logging.Handler()
+    emit = handler.emit = records.append
+    logger = glog.__init__(
+        "test_reconfigure_methods", handlers=[handler],
+        options={"formatOutsideLock": True, "stats": True},
+        gname="test_reconfigure_methods"
+    )
+    assert handler.emit is not emit
+
+    glog.reconfigure("test_reconfigure_methods", options={})
+
+    assert handler.emit is emit
+    assert not {"handle", "format", "handleError"} & set(handler.__dict__)
+    glog.info("message", gname="test_reconfigure_methods")
+    assert [x.getMessage() for x in records] == ["message"]
+
+
+def test_watch_config(tmp_path, capsys):
+    import json
+    import time
+
+    file = tmp_path / "config.json"
+    mtime = [time.time_ns()]
+
+    def write(text: str) -> None:
+        file.write_text(text)
+        # Changed for sure, whatever the resolution of the file system.
+        mtime[0] += 10 ** 9
+        os.utime(file, ns=(mtime[0], mtime[0]))
+
+    def wait_for(condition) -> None:
+        deadline = time.monotonic() + 10
+        while not condition():
+            assert time.monotonic() < deadline
+            time.sleep(.01)
+
+    write(json.dumps({"test_watch_config": {"level": "INFO"}}))
+    stop = glog.watch_config(str(file), interval=.01)
+    try:
+        logger = glog.test_watch_config
+        assert logger.level == logging.INFO
+
+        write(json.dumps({"test_watch_config": {"level": "DEBUG"}}))
+        wait_for(lambda: logger.level == logging.DEBUG)
+
+        write("{")
+        wait_for(lambda: "JSONDecodeError" in capsys.readouterr().err)
+        assert glog.test_watch_config is logger
+        assert logger.level == logging.DEBUG
+
+        write(json.dumps({"test_watch_config": {"level": "ERROR"}}))
+        wait_for(lambda: logger.level == logging.ERROR)
+    finally:
+        stop()
@@ -0,0 +1,32 @@
+import pytest
+
+from gqylpy_log import query
+
+
+def test_logger_filter(tmp_path, capsys):
+    log = tmp_path / "a.log"
+    log.write_text("app INFO one\napp.db INFO two\nother INFO three\n")
+
+    query.main([
+        "--logger", "app", "--fmt", "%(name)s %(levelname)s %(message)s",
+        str(log)
+    ])
+
+    assert capsys.readouterr().out == "app INFO one\napp.db INFO two\n"
+
+
+def test_logger_without_name_in_format(tmp_path, capsys):
+    log = tmp_path / "a.log"
+    log.write_text("INFO one\n")
+
+    with pytest.raises(SystemExit) as e:
+        query.main([
+            "--logger", "app", "--fmt", "%(levelname)s %(message)s",
+            str(log)
+        ])
+
+    assert e.value.code == 2
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "needs '%(name)s' in the format" in captured.err
+    assert "Traceback" not in captured.err